@@ -0,0 +1,162 @@
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from engine.jobs import STRATEGIES, normalize, run_job
+from engine.rsi_modes import HAS_NUMBA, NUMBA_WARNING
+
+# --- API JSON LOCALE DES BACKTESTS ---
+# Usage : python api.py --port 8600
+#   GET  /health                  -> état du serveur (et moteurs compilés disponibles)
+#   GET  /strategies              -> stratégies disponibles
+#   POST /backtest/<stratégie>    -> corps JSON = paramètres (valeurs par défaut des pages sinon)
+# Les calculs tournent dans un pool de processus borné (un worker par cœur) ;
+# des requêtes identiques simultanées partagent un seul calcul.
+
+
+class Coalescer:
+    """Regroupe les requêtes identiques en vol sur un même Future du pool.
+
+    `make_executor` crée le pool de processus ; il est recréé si un worker meurt
+    (BrokenProcessPool), sinon toutes les requêtes suivantes échoueraient.
+    """
+
+    def __init__(self, make_executor, max_pending):
+        self._make_executor = make_executor
+        self.executor = make_executor()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, strategy, params):
+        # Clé sur les paramètres normalisés : {} et les valeurs par défaut explicites partagent un calcul
+        params = normalize(strategy, params)
+        key = json.dumps([strategy, params], sort_keys=True)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            # File d'attente bornée : au-delà, le client doit réessayer plus tard
+            if not self._slots.acquire(blocking=False):
+                return None
+            executor = self.executor
+            try:
+                future = executor.submit(run_job, strategy, params)
+            except BaseException as e:
+                # Aucun Future créé : la place est rendue ici, l'erreur remonte au handler (500)
+                self._slots.release()
+                if isinstance(e, BrokenProcessPool):
+                    self._renew(executor)
+                raise
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._done(key, f, executor))
+        return future
+
+    def _renew(self, broken):
+        # Appelé sous self._lock ; un seul remplacement par pool cassé
+        if self.executor is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._make_executor()
+
+    def _done(self, key, future, executor):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                self._renew(executor)
+        self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            self.executor.shutdown(cancel_futures=True)
+
+
+def make_handler(coalescer, timeout):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"status": "ok", "numba": HAS_NUMBA})
+            elif self.path == "/strategies":
+                self._send(200, {"strategies": STRATEGIES})
+            else:
+                self._send(404, {"error": f"Route inconnue : {self.path}"})
+
+        def do_POST(self):
+            prefix = "/backtest/"
+            strategy = self.path[len(prefix):] if self.path.startswith(prefix) else None
+            if strategy not in STRATEGIES:
+                self._send(404, {"error": f"Route inconnue : {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                params = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(params, dict):
+                    raise ValueError("Le corps doit être un objet JSON.")
+            except ValueError as e:
+                self._send(400, {"error": f"JSON invalide : {e}"})
+                return
+
+            try:
+                future = coalescer.submit(strategy, params)
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+                return
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            if future is None:
+                self._send(503, {"error": "Serveur saturé, réessayez plus tard."})
+                return
+            try:
+                self._send(200, future.result(timeout=timeout))
+            except TimeoutError:
+                self._send(504, {"error": f"Calcul non terminé après {timeout:g} s."})
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON locale des backtests RSI et momentum")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processus de calcul (défaut : un par cœur)")
+    parser.add_argument("--max-pending", type=int, default=None, help="Calculs distincts en attente (défaut : 8 par worker)")
+    parser.add_argument("--timeout", type=float, default=600, help="Délai max d'un calcul (secondes)")
+    args = parser.parse_args()
+
+    # 'spawn' : pas de fork d'un processus qui a déjà des threads serveur
+    def make_executor():
+        return ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    coalescer = Coalescer(make_executor, args.max_pending or 8 * args.workers)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(coalescer, args.timeout))
+    print(f"API backtests sur http://{args.host}:{args.port} ({args.workers} workers)")
+    if not HAS_NUMBA:
+        print(f"Attention : {NUMBA_WARNING}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        coalescer.shutdown()
+
+
+if __name__ == "__main__":
+    main()
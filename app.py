@@ -1,10 +1,15 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from datetime import date
 
+from engine.data import download_weekly_close
+from engine.rsi import compute_rsi_strategy
+from engine.rsi_modes import HAS_NUMBA, NUMBA_WARNING, compute_rsi_mode
+from engine.speculative import SpeculativeCache, neighbour_params, params_key
+from widgets import rolling_risk_section
+
 # --- CONFIGURATION DE LA PAGE ---
 st.set_page_config(page_title="RSI Strategy Ultimate", layout="wide")
 
@@ -15,12 +20,9 @@ ticker = st.sidebar.text_input("Symbole Yahoo Finance", "^GSPC")
 # CHOIX DE LA PÉRIODE RSI
 rsi_period = st.sidebar.slider("Période du RSI (Fenêtre)", min_value=2, max_value=30, value=10)
 
-# --- AJOUT : SÉLECTEUR TAUX SANS RISQUE ---
-risk_free_rate = st.sidebar.slider("Taux sans risque (pour Sharpe)", min_value=0.0, max_value=0.10, value=0.02, step=0.005)
-
 st.title(f"📊 Analyse Comparative : Stratégie RSI {rsi_period} vs Indice")
-st.markdown(f"""
-Tableau de bord complet : Performance Totale, CAGR, Volatilité, Max Drawdown et Ratio de Sharpe (RF: {risk_free_rate*100:.2f}%).
+st.markdown("""
+Tableau de bord complet : Performance Totale, CAGR, Volatilité, Max Drawdown et Ratio de Sharpe.
 """)
 
 # --- SÉLECTEURS DE DATES ---
@@ -36,137 +38,173 @@ st.sidebar.subheader("Seuils RSI")
 threshold_buy = st.sidebar.number_input("Seuil Achat (Tendance)", value=50)
 threshold_panic = st.sidebar.number_input("Seuil Achat (Panique)", value=32)
 
+# --- MODE AVEC ÉTAT (noyaux compilés, cf. engine/rsi_modes.py) ---
+stateful = st.sidebar.checkbox("🔁 Mode avec état", value=False,
+                               help="Seuil de sortie distinct, stop suiveur, durée minimale de détention et cooldown après stop.")
+mode = None
+if stateful:
+    mode = dict(
+        th_exit=st.sidebar.number_input("Seuil Sortie (Tendance)", value=threshold_buy),
+        trail_stop=st.sidebar.slider("Stop suiveur (%)", 0, 50, 0) / 100,
+        min_hold=st.sidebar.number_input("Détention minimale (semaines)", min_value=1, value=1),
+        cooldown=st.sidebar.number_input("Cooldown après stop (semaines)", min_value=0, value=0),
+    )
+    if not HAS_NUMBA:
+        st.sidebar.warning(f"⚠️ {NUMBA_WARNING}")
+
+# --- MODE PERFORMANCE ---
+speculative = st.sidebar.checkbox("⚡ Précalcul des valeurs voisines", value=False,
+                                  help="Calcule en arrière-plan les résultats pour les réglages adjacents (période RSI ±1).")
+
 # --- FONCTIONS DE CALCUL ---
 @st.cache_data
-def get_data_and_calc(ticker, start, end, fees, th_buy, th_panic, period):
-    # Téléchargement avec group_by pour stabiliser le format
-    df = yf.download(ticker, start=start, end=end, interval="1wk", group_by='column')
-    
-    if df.empty: 
-        return None
-    
-    # Nettoyage des colonnes (Gestion du bug MultiIndex de Yahoo Finance)
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
-    
-    # Vérification de sécurité
-    if 'Close' not in df.columns:
+def load_prices(ticker, start, end):
+    return download_weekly_close(ticker, start, end)
+
+@st.cache_resource
+def get_speculative_cache():
+    return SpeculativeCache(max_entries=64)
+
+def get_data_and_calc(ticker, start, end, fees, th_buy, th_panic, period, mode=None):
+    prices = load_prices(ticker, start, end)
+    if prices is None:
         return None
 
-    df = df[['Close']].copy()
-    df.columns = ['price']
-    
-    # Calcul RSI
-    delta = df['price'].diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.rolling(window=period).mean()
-    avg_loss = loss.rolling(window=period).mean()
-    rs = avg_gain / avg_loss
-    df['rsi'] = 100 - (100 / (1 + rs))
-    
-    # Signaux et Rendements
-    df['signal'] = 0
-    df.loc[(df['rsi'] >= th_buy) | (df['rsi'] < th_panic), 'signal'] = 1
-    
-    df['mkt_ret'] = df['price'].pct_change()
-    df['strat_ret_raw'] = df['signal'].shift(1) * df['mkt_ret']
-    df['trade'] = df['signal'].diff().fillna(0).abs()
-    df['net_ret'] = df['strat_ret_raw'] - (df['trade'] * fees)
-    
-    df['cum_mkt'] = (1 + df['mkt_ret'].fillna(0)).cumprod()
-    df['cum_strat'] = (1 + df['net_ret'].fillna(0)).cumprod()
-    
-    return df
+    params = dict(ticker=ticker, start=start, end=end, fees=fees, th_buy=th_buy, th_panic=th_panic, period=period, **(mode or {}))
+    strategy, extra = (compute_rsi_mode, mode) if mode else (compute_rsi_strategy, {})
+    cache = get_speculative_cache()
+    result = cache.get(params_key(params), strategy, prices, fees, th_buy, th_panic, period, **extra)
+
+    # Précalcul des voisins (période RSI ±1) pendant que l'utilisateur lit les résultats
+    if speculative:
+        cache.prefetch([
+            (params_key(p), strategy, (prices, fees, th_buy, th_panic, p['period']), extra)
+            for p in neighbour_params(params, {'period': (1, 2, 30)})
+        ])
+    return result
 
 def calc_max_drawdown(cum_series):
     peak = cum_series.cummax()
     drawdown = (cum_series - peak) / peak
     return drawdown.min() * 100
 
+# --- BLOCS D'AFFICHAGE ---
+# Seuls les blocs qui portent leurs propres widgets sont des fragments : un
+# widget placé dans un fragment ne relance que ce fragment, pas le
+# téléchargement / backtest ni les autres blocs. Les réglages de la barre
+# latérale relancent toujours toute la page.
+def render_chart(data, ticker):
+    st.subheader("📈 Évolution Comparative (Échelle Log)")
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=data.index, y=data['cum_mkt'], name=f"Indice ({ticker})", line=dict(color='gray', width=1, dash='dot')))
+    fig.add_trace(go.Scatter(x=data.index, y=data['cum_strat'], name="Ma Stratégie", line=dict(color='green', width=2.5)))
+    fig.update_layout(yaxis_type="log", template="plotly_white", height=450, hovermode="x unified")
+    st.plotly_chart(fig, use_container_width=True)
+
+def render_metrics(data, risk_free_rate):
+    years = (data.index[-1] - data.index[0]).days / 365.25
+
+    st.subheader("📊 Métriques Stratégie vs Indice")
+
+    total_strat = (data['cum_strat'].iloc[-1] - 1) * 100
+    total_mkt = (data['cum_mkt'].iloc[-1] - 1) * 100
+    
+    cagr_strat = (data['cum_strat'].iloc[-1] ** (1/years) - 1) * 100 if years > 0 else 0
+    cagr_mkt = (data['cum_mkt'].iloc[-1] ** (1/years) - 1) * 100 if years > 0 else 0
+    
+    vol_strat = data['net_ret'].std() * np.sqrt(52) * 100
+    vol_mkt = data['mkt_ret'].std() * np.sqrt(52) * 100
+    
+    mdd_strat = calc_max_drawdown(data['cum_strat'])
+    mdd_mkt = calc_max_drawdown(data['cum_mkt'])
+
+    # --- CALCUL SHARPE AVEC VARIABLE risk_free_rate ---
+    sharpe_strat = ((data['net_ret'].mean() * 52) - risk_free_rate) / (data['net_ret'].std() * np.sqrt(52)) if data['net_ret'].std() != 0 else 0
+    sharpe_mkt = ((data['mkt_ret'].mean() * 52) - risk_free_rate) / (data['mkt_ret'].std() * np.sqrt(52)) if data['mkt_ret'].std() != 0 else 0
+
+    # AFFICHAGE DES MÉTRIQUES (LIGNE 1 : PERF / LIGNE 2 : RISQUE)
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.write("**Performance Totale**")
+        st.metric("Stratégie", f"{total_strat:,.2f} %", delta=f"{total_strat - total_mkt:,.2f} %")
+        st.metric("Indice", f"{total_mkt:,.2f} %")
+    with col2:
+        st.write("**CAGR (Annuel)**")
+        st.metric("Stratégie", f"{cagr_strat:.2f} %", delta=f"{cagr_strat - cagr_mkt:.2f} %")
+        st.metric("Indice", f"{cagr_mkt:.2f} %")
+    with col3:
+        st.write("**Volatilité Annuelle**")
+        st.metric("Stratégie", f"{vol_strat:.2f} %", delta=f"{vol_strat - vol_mkt:.2f} %", delta_color="inverse")
+        st.metric("Indice", f"{vol_mkt:.2f} %")
+    with col4:
+        st.write("**Max Drawdown**")
+        st.metric("Stratégie", f"{mdd_strat:.2f} %", delta=f"{mdd_strat - mdd_mkt:.2f} % pts")
+        st.metric("Indice", f"{mdd_mkt:.2f} %")
+    with col5:
+        st.write(f"**Ratio de Sharpe** (RF: {risk_free_rate*100:.2f}%)")
+        st.metric("Stratégie", f"{sharpe_strat:.2f}", delta=f"{sharpe_strat - sharpe_mkt:.2f}")
+        st.metric("Indice", f"{sharpe_mkt:.2f}")
+
+def rolling_inputs(data, ticker, start, end):
+    # Beta toujours mesuré contre le S&P 500 (^GSPC), quel que soit le symbole analysé
+    gspc = None if ticker == "^GSPC" else load_prices("^GSPC", start, end)
+    bench = gspc['price'].pct_change() if gspc is not None else data['mkt_ret']
+    returns = data[['net_ret', 'mkt_ret']].rename(columns={'net_ret': 'Ma Stratégie', 'mkt_ret': f'Indice ({ticker})'})
+    return returns, bench
+
+@st.fragment
+def render_risk(data, ticker, start, end):
+    # Taux sans risque partagé par les métriques et le Sharpe glissant : le modifier ne relance que ce fragment
+    risk_free_rate = st.slider("Taux sans risque (pour Sharpe)", min_value=0.0, max_value=0.10, value=0.02, step=0.005)
+    render_metrics(data, risk_free_rate)
+
+    st.write("---")
+
+    rolling_risk_section(*rolling_inputs(data, ticker, start, end), periods_per_year=52, risk_free_rate=risk_free_rate)
+
+@st.fragment  # le bouton de téléchargement ne relance que ce bloc
+def render_annual(data, ticker):
+    st.subheader("📅 Analyse par Année Civile")
+
+    # Produit des (1 + r) par année en une seule passe groupby (pas d'apply Python)
+    growth = 1 + data[['net_ret', 'mkt_ret']].fillna(0)
+    annual = (growth.groupby(data.index.year).prod() - 1) * 100
+    annual_strat, annual_mkt = annual['net_ret'], annual['mkt_ret']
+    
+    df_annual = pd.DataFrame({
+        'Stratégie (%)': annual_strat,
+        'Indice (%)': annual_mkt,
+        'Différence (%)': annual_strat - annual_mkt
+    }).sort_index(ascending=False)
+
+    c_table, c_export = st.columns([3, 1])
+    with c_table:
+        st.dataframe(df_annual.style.format("{:.2f} %").applymap(
+            lambda val: f'color: {"green" if val > 0 else "red"}', subset=['Différence (%)']
+        ), use_container_width=True)
+    with c_export:
+        st.write("📥 **Exportation**")
+        csv = df_annual.to_csv(index=True).encode('utf-8')
+        st.download_button("Télécharger CSV", data=csv, file_name=f"RSI_Analysis_{ticker}.csv", mime='text/csv')
+        st.info(f"Trades : {int(data['trade'].sum())}")
+
 # --- EXÉCUTION ---
 if start_date >= end_date:
     st.error("Erreur : La date de début doit être antérieure à la date de fin.")
 else:
-    data = get_data_and_calc(ticker, start_date, end_date, fees, threshold_buy, threshold_panic, rsi_period)
+    data = get_data_and_calc(ticker, start_date, end_date, fees, threshold_buy, threshold_panic, rsi_period, mode)
 
     if data is not None:
-        years = (data.index[-1] - data.index[0]).days / 365.25
-
         # 1. GRAPHIQUE
-        st.subheader("📈 Évolution Comparative (Échelle Log)")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=data.index, y=data['cum_mkt'], name=f"Indice ({ticker})", line=dict(color='gray', width=1, dash='dot')))
-        fig.add_trace(go.Scatter(x=data.index, y=data['cum_strat'], name="Ma Stratégie", line=dict(color='green', width=2.5)))
-        fig.update_layout(yaxis_type="log", template="plotly_white", height=450, hovermode="x unified")
-        st.plotly_chart(fig, use_container_width=True)
-
-        # 2. CALCULS DES MÉTRIQUES
-        total_strat = (data['cum_strat'].iloc[-1] - 1) * 100
-        total_mkt = (data['cum_mkt'].iloc[-1] - 1) * 100
-        
-        cagr_strat = (data['cum_strat'].iloc[-1] ** (1/years) - 1) * 100 if years > 0 else 0
-        cagr_mkt = (data['cum_mkt'].iloc[-1] ** (1/years) - 1) * 100 if years > 0 else 0
-        
-        vol_strat = data['net_ret'].std() * np.sqrt(52) * 100
-        vol_mkt = data['mkt_ret'].std() * np.sqrt(52) * 100
-        
-        mdd_strat = calc_max_drawdown(data['cum_strat'])
-        mdd_mkt = calc_max_drawdown(data['cum_mkt'])
-
-        # --- MISE À JOUR : CALCUL SHARPE AVEC VARIABLE risk_free_rate ---
-        sharpe_strat = ((data['net_ret'].mean() * 52) - risk_free_rate) / (data['net_ret'].std() * np.sqrt(52)) if data['net_ret'].std() != 0 else 0
-        sharpe_mkt = ((data['mkt_ret'].mean() * 52) - risk_free_rate) / (data['mkt_ret'].std() * np.sqrt(52)) if data['mkt_ret'].std() != 0 else 0
-
-        # 3. AFFICHAGE DES MÉTRIQUES (LIGNE 1 : PERF / LIGNE 2 : RISQUE)
-        st.subheader("📊 Métriques Stratégie vs Indice")
-        
-        col1, col2, col3, col4, col5 = st.columns(5) # Ajout d'une 5ème colonne
-        with col1:
-            st.write("**Performance Totale**")
-            st.metric("Stratégie", f"{total_strat:,.2f} %", delta=f"{total_strat - total_mkt:,.2f} %")
-            st.metric("Indice", f"{total_mkt:,.2f} %")
-        with col2:
-            st.write("**CAGR (Annuel)**")
-            st.metric("Stratégie", f"{cagr_strat:.2f} %", delta=f"{cagr_strat - cagr_mkt:.2f} %")
-            st.metric("Indice", f"{cagr_mkt:.2f} %")
-        with col3:
-            st.write("**Volatilité Annuelle**")
-            st.metric("Stratégie", f"{vol_strat:.2f} %", delta=f"{vol_strat - vol_mkt:.2f} %", delta_color="inverse")
-            st.metric("Indice", f"{vol_mkt:.2f} %")
-        with col4:
-            st.write("**Max Drawdown**")
-            st.metric("Stratégie", f"{mdd_strat:.2f} %", delta=f"{mdd_strat - mdd_mkt:.2f} % pts")
-            st.metric("Indice", f"{mdd_mkt:.2f} %")
-        with col5:
-            st.write("**Ratio de Sharpe**")
-            st.metric("Stratégie", f"{sharpe_strat:.2f}", delta=f"{sharpe_strat - sharpe_mkt:.2f}")
-            st.metric("Indice", f"{sharpe_mkt:.2f}")
+        render_chart(data, ticker)
+
+        # 2. MÉTRIQUES & 3. RISQUE GLISSANT
+        render_risk(data, ticker, start_date, end_date)
 
         st.write("---")
 
         # 4. ANALYSE ANNUELLE & EXPORT
-        st.subheader("📅 Analyse par Année Civile")
-        
-        annual_strat = data['net_ret'].groupby(data.index.year).apply(lambda x: (np.prod(1 + x.fillna(0)) - 1) * 100)
-        annual_mkt = data['mkt_ret'].groupby(data.index.year).apply(lambda x: (np.prod(1 + x.fillna(0)) - 1) * 100)
-        
-        df_annual = pd.DataFrame({
-            'Stratégie (%)': annual_strat,
-            'Indice (%)': annual_mkt,
-            'Différence (%)': annual_strat - annual_mkt
-        }).sort_index(ascending=False)
-
-        c_table, c_export = st.columns([3, 1])
-        with c_table:
-            st.dataframe(df_annual.style.format("{:.2f} %").applymap(
-                lambda val: f'color: {"green" if val > 0 else "red"}', subset=['Différence (%)']
-            ), use_container_width=True)
-        with c_export:
-            st.write("📥 **Exportation**")
-            csv = df_annual.to_csv(index=True).encode('utf-8')
-            st.download_button("Télécharger CSV", data=csv, file_name=f"RSI_Analysis_{ticker}.csv", mime='text/csv')
-            st.info(f"Trades : {int(data['trade'].sum())}")
+        render_annual(data, ticker)
 
     else:
         st.error("Données indisponibles.")
@@ -0,0 +1,93 @@
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+# --- SERVICE BENCHMARK (^GSPC / SPY) ---
+# Chaque benchmark est téléchargé une seule fois par processus (historique
+# complet, rafraîchi une fois par jour) puis partagé par toutes les pages et
+# sessions. Les moyennes mobiles de n'importe quelle fenêtre sont servies à
+# partir d'une unique passe de somme cumulée : le filtre de tendance devient
+# une simple lecture.
+
+
+class Benchmark:
+    """Série de clôtures + sommes cumulées ; SMA et filtres de tendance en cache par fenêtre."""
+
+    def __init__(self, close, open_=None):
+        self.close = close.dropna()
+        self.open = open_.reindex(self.close.index) if open_ is not None else None
+        values = self.close.to_numpy(dtype=float)
+        self._cumsum = np.concatenate([[0.0], np.cumsum(values)])
+        self._sma = {}
+        self._trend = {}
+        self._monthly = None
+        self._lock = threading.Lock()
+
+    def sma(self, window):
+        with self._lock:
+            if window not in self._sma:
+                out = np.full(len(self.close), np.nan)
+                if window <= len(self.close):
+                    out[window - 1:] = (self._cumsum[window:] - self._cumsum[:-window]) / window
+                self._sma[window] = pd.Series(out, index=self.close.index)
+            return self._sma[window]
+
+    def trend(self, window):
+        # True quand le benchmark clôture au-dessus de sa SMA (False tant que la SMA n'existe pas)
+        if window not in self._trend:
+            self._trend[window] = self.close > self.sma(window)
+        return self._trend[window]
+
+    def monthly(self):
+        # Clôtures de fin de mois (pour les filtres exprimés en mois)
+        if self._monthly is None:
+            self._monthly = Benchmark(self.close.resample('ME').last())
+        return self._monthly
+
+    def frame(self, symbol):
+        # Colonnes Close / Open au format des pages (une colonne par symbole)
+        closes = self.close.rename(symbol).to_frame()
+        opens = self.open.rename(symbol).to_frame() if self.open is not None else None
+        return closes, opens
+
+
+def download_benchmark(symbol):
+    data = yf.download(symbol, period="max", interval="1d", progress=False)
+    if data.empty:
+        return None
+    if isinstance(data.columns, pd.MultiIndex):  # Gère le nouveau format yfinance
+        data.columns = data.columns.get_level_values(0)
+    close = data['Adj Close'] if 'Adj Close' in data.columns else data['Close']
+    return Benchmark(close, data['Open'])
+
+
+_benchmarks = {}
+_loaded_on = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def get_benchmark(symbol):
+    with _registry_lock:
+        lock = _locks.setdefault(symbol, threading.Lock())
+    # Un verrou par symbole : des sessions simultanées attendent le même téléchargement
+    with lock:
+        if symbol not in _benchmarks or _loaded_on.get(symbol) != date.today():
+            bench = download_benchmark(symbol)
+            if bench is None:
+                return _benchmarks.get(symbol)
+            _benchmarks[symbol] = bench
+            _loaded_on[symbol] = date.today()
+        return _benchmarks[symbol]
+
+
+def with_benchmark(closes, opens, symbol, bench):
+    # Ajoute les colonnes du benchmark partagé au panel d'une page, limitées à sa période
+    b_close, b_open = bench.frame(symbol)
+    span = slice(closes.index[0], closes.index[-1])
+    closes = pd.concat([closes, b_close.loc[span]], axis=1).ffill()
+    opens = pd.concat([opens, b_open.loc[span]], axis=1).ffill()
+    return closes, opens
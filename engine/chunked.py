@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+from engine.data import SP500_CSV
+from engine.factors import MomentumFactors
+from engine.rsi_modes import MODE_DEFAULTS, scan_rsi_modes
+
+# --- EXÉCUTION PAR BLOCS (HORS MÉMOIRE) ---
+# Le panel quotidien (dates × tickers) reste sur disque (.npy) et n'est lu que
+# par tuiles (bloc de dates ou bloc de tickers) dont la taille découle d'un
+# budget mémoire fixe. Lectures positionnelles (pread) plutôt que memmap : seules
+# les tuiles en cours occupent la mémoire du processus. Restent en mémoire les
+# résultats réduits : clôtures de fin de mois, top-N partiels, lignes du scanner.
+# Chaque étape est exacte : mêmes chiffres que le chemin pandas en mémoire.
+
+MEMORY_MB = 256
+
+
+def _block(n_cells_per_unit, memory_mb, copies):
+    # Nombre d'unités (tickers ou dates) tenant dans le budget, `copies` tableaux float64 de travail inclus
+    return max(1, int(memory_mb * 2 ** 20 // (n_cells_per_unit * 8 * copies)))
+
+
+class PanelStore:
+    """Panel de prix float64 (dates × tickers, ordre C) dans un .npy sur disque, lu par tuiles."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, 'prices.npy')
+        with open(self.path, 'rb') as f:
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            self.shape, _, _ = read_header(f)
+            self._offset = f.tell()
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(directory, 'dates.npy')))
+        with open(os.path.join(directory, 'tickers.json')) as f:
+            self.tickers = pd.Index(json.load(f))
+
+    def tile(self, t0, t1, j0, j1):
+        n_tickers = self.shape[1]
+        out = np.empty((t1 - t0, j1 - j0))
+        with open(self.path, 'rb', buffering=0) as f:
+            if j0 == 0 and j1 == n_tickers:
+                # Lignes complètes : une seule lecture contiguë
+                f.seek(self._offset + t0 * n_tickers * 8)
+                f.readinto(memoryview(out).cast('B'))
+            else:
+                fd = f.fileno()
+                for r in range(t0, t1):
+                    out[r - t0] = np.frombuffer(os.pread(fd, (j1 - j0) * 8, self._offset + (r * n_tickers + j0) * 8))
+        return out
+
+    def frame(self, j0, j1):
+        # Historique complet d'un bloc de tickers
+        return pd.DataFrame(self.tile(0, len(self.dates), j0, j1), index=self.dates, columns=self.tickers[j0:j1])
+
+    @classmethod
+    def from_csv(cls, path, directory, memory_mb=MEMORY_MB):
+        # Conversion en flux : le CSV n'est jamais chargé en entier. Chaque ligne est
+        # écrite directement à son rang chronologique (équivalent de sort_index).
+        dates = pd.to_datetime(pd.read_csv(path, usecols=['Date'])['Date']).to_numpy()
+        rank = np.empty(len(dates), dtype=np.int64)
+        rank[np.argsort(dates, kind='stable')] = np.arange(len(dates))
+        tickers = [c for c in pd.read_csv(path, nrows=0).columns if c != 'Date']
+        chunk_rows = _block(len(tickers), memory_mb, copies=4)  # bloc parsé par pandas + copie numpy
+
+        # Construction dans un répertoire propre au processus, publié d'un seul rename (cf. columnar._parquet)
+        tmp = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        with open(os.path.join(tmp, 'prices.npy'), 'wb') as f:
+            header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.float64)), 'fortran_order': False,
+                      'shape': (len(dates), len(tickers))}
+            np.lib.format.write_array_header_1_0(f, header)
+            offset = f.tell()
+            f.truncate(offset + len(dates) * len(tickers) * 8)
+            row = 0
+            for chunk in pd.read_csv(path, chunksize=chunk_rows):
+                values = chunk[tickers].to_numpy(dtype=np.float64)
+                for k in range(len(values)):
+                    os.pwrite(f.fileno(), values[k].tobytes(), offset + rank[row + k] * len(tickers) * 8)
+                row += len(values)
+        np.save(os.path.join(tmp, 'dates.npy'), np.sort(dates, kind='stable'))
+        with open(os.path.join(tmp, 'tickers.json'), 'w') as f:
+            json.dump(tickers, f)
+        _publish(tmp, directory)
+        return cls(directory)
+
+
+def _publish(tmp, directory):
+    # Un répertoire non vide ne peut pas être écrasé par rename : l'ancien magasin est d'abord écarté
+    old = f"{directory}.{os.getpid()}.old"
+    try:
+        os.replace(directory, old)
+    except FileNotFoundError:
+        old = None
+    try:
+        os.replace(tmp, directory)
+    except OSError:
+        # Un autre processus a publié entre-temps le même magasin : le sien est conservé
+        shutil.rmtree(tmp, ignore_errors=True)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def open_sp500_store(path=SP500_CSV, memory_mb=MEMORY_MB):
+    # Magasin à côté du CSV, reconstruit si le CSV est plus récent
+    if not os.path.exists(path):
+        return None
+    directory = os.path.splitext(path)[0] + '.store'
+    target = os.path.join(directory, 'prices.npy')
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+        return PanelStore.from_csv(path, directory, memory_mb)
+    return PanelStore(directory)
+
+
+def monthly_asof(store, cutoffs, memory_mb=MEMORY_MB):
+    """Dernière valeur connue de chaque ticker à chaque date de `cutoffs` (croissantes).
+
+    Équivaut à un ffill sur tout l'historique puis une lecture aux dates de coupure,
+    mais bloc de dates par bloc de dates avec une ligne de report entre blocs.
+    """
+    n_dates, n_tickers = store.shape
+    cut_rows = store.dates.searchsorted(pd.DatetimeIndex(cutoffs), side='right') - 1
+    out = np.full((len(cut_rows), n_tickers), np.nan)
+
+    date_block = _block(n_tickers, memory_mb, copies=4)
+    carry = np.full(n_tickers, np.nan)
+    for t0 in range(0, n_dates, date_block):
+        t1 = min(t0 + date_block, n_dates)
+        x = np.vstack([carry, store.tile(t0, t1, 0, n_tickers)])
+        # ffill vectorisé : indice de la dernière ligne valide, colonne par colonne
+        last = np.where(~np.isnan(x), np.arange(len(x))[:, None], 0)
+        np.maximum.accumulate(last, axis=0, out=last)
+        filled = np.take_along_axis(x, last, axis=0)
+        hit = (cut_rows >= t0) & (cut_rows < t1)
+        out[hit] = filled[cut_rows[hit] - t0 + 1]
+        carry = filled[-1]
+    return out
+
+
+def prepare_sp500_chunked(store, df_bench, start, end, memory_mb=MEMORY_MB):
+    # Même résultat que momentum.prepare_sp500, sans charger le panel quotidien
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    bench = df_bench['^GSPC']
+    first = bench.first_valid_index()
+    if first is None:
+        return pd.DataFrame(), pd.Series(dtype=float, name='^GSPC')
+
+    # Dates de l'union assets ∪ benchmark retenues par prepare_sp500 (après le 1er ^GSPC, dans [start, end])
+    union = store.dates.rename('Date').union(bench.index)  # nom d'index comme pd.concat
+    dates = union[(union >= max(start, first)) & (union <= end)]
+    if dates.empty:
+        return pd.DataFrame(), pd.Series(dtype=float, name='^GSPC')
+    cutoffs = pd.Series(dates, index=dates).resample('ME').last()
+    valid = cutoffs.notna().to_numpy()
+
+    m_bench = pd.Series(np.nan, index=cutoffs.index, name='^GSPC')
+    m_bench[valid] = bench.reindex(union).ffill().loc[cutoffs[valid]].to_numpy()
+    values = np.full((len(cutoffs), len(store.tickers)), np.nan)
+    values[valid] = monthly_asof(store, cutoffs[valid], memory_mb)
+    return pd.DataFrame(values, index=cutoffs.index, columns=store.tickers), m_bench
+
+
+class ChunkedFactors:
+    """Classements momentum calculés par blocs de tickers : top-N partiel par bloc puis fusion exacte.
+
+    Interface de MomentumFactors limitée aux `n_max` premiers (top / ranking), sans
+    jamais matérialiser le cube mois × tickers × look-backs.
+    """
+
+    def __init__(self, monthly_close, n_max, memory_mb=MEMORY_MB):
+        self.index = monthly_close.index
+        self.tickers = monthly_close.columns
+        self.n_max = n_max
+        self._monthly = monthly_close
+        self._block = _block(len(self.index), memory_mb, copies=8)
+        self._tops = {}
+        self._lock = threading.Lock()
+
+    def _build(self, lookback, variant):
+        n_months = len(self.index)
+        cand_idx, cand_score = [], []
+        for j0 in range(0, len(self.tickers), self._block):
+            block = self._monthly.iloc[:, j0:j0 + self._block]
+            scores = MomentumFactors(block, lookbacks=[lookback]).scores(lookback, variant).to_numpy()
+            # Top-N partiel du bloc (score décroissant, NaN exclus)
+            k = min(self.n_max, scores.shape[1])
+            order = np.argsort(np.where(np.isnan(scores), np.inf, -scores), axis=1, kind='stable')[:, :k]
+            cand_idx.append(order + j0)
+            cand_score.append(np.take_along_axis(scores, order, axis=1))
+
+        # Fusion : tri global des candidats (score décroissant, puis ordre des colonnes comme le tri stable)
+        idx, score = np.hstack(cand_idx), np.hstack(cand_score)
+        key = np.where(np.isnan(score), np.inf, -score)
+        top = np.empty((n_months, min(self.n_max, idx.shape[1])), dtype=np.int64)
+        counts = np.empty(n_months, dtype=np.int64)
+        for i in range(n_months):
+            order = np.lexsort((idx[i], key[i]))[:top.shape[1]]
+            top[i] = idx[i, order]
+            counts[i] = (~np.isnan(score[i, order])).sum()
+        return top, counts
+
+    def _ensure(self, lookback, variant):
+        with self._lock:
+            if (lookback, variant) not in self._tops:
+                self._tops[lookback, variant] = self._build(lookback, variant)
+            return self._tops[lookback, variant]
+
+    def ranking(self, i, lookback, variant="simple"):
+        # Les n_max meilleurs tickers du mois i (scores manquants exclus)
+        top, counts = self._ensure(lookback, variant)
+        return self.tickers[top[i, :counts[i]]].tolist()
+
+    def top(self, i, lookback, n, variant="simple"):
+        if n > self.n_max:
+            raise ValueError(f"n={n} dépasse n_max={self.n_max}")
+        return self.ranking(i, lookback, variant)[:n]
+
+
+def scan_rsi_chunked(store, grid, fees, periods_per_year=252, memory_mb=MEMORY_MB, top=None, by="sharpe"):
+    """scan_rsi_modes par blocs de tickers lus depuis le disque.
+
+    Avec `top`, seules les `top` meilleures lignes (selon `by`) de chaque bloc sont
+    conservées puis fusionnées : le résultat est le top global exact.
+    """
+    n_dates, n_tickers = store.shape
+    n_periods = len({g.get('period', MODE_DEFAULTS['period']) for g in grid})
+    block = _block(n_dates, memory_mb, copies=n_periods + 8)
+    parts = []
+    for j0 in range(0, n_tickers, block):
+        rows = scan_rsi_modes(store.frame(j0, min(j0 + block, n_tickers)), grid, fees, periods_per_year)
+        parts.append(rows.nlargest(top, by) if top else rows)
+    result = pd.concat(parts, ignore_index=True)
+    return result.nlargest(top, by).reset_index(drop=True) if top else result
@@ -0,0 +1,91 @@
+import os
+
+import pandas as pd
+
+from engine.data import SP500_CSV
+
+try:
+    import polars as pl
+except ImportError:  # Moteur optionnel : les pages retombent sur pandas
+    pl = None
+
+# --- MOTEUR COLONNAIRE LAZY (POLARS) POUR LE PANEL S&P 500 ---
+# Même résultat que momentum.prepare_sp500, mais en une seule requête lazy :
+# lecture Parquet (seules les colonnes / dates utiles sont lues), union avec
+# le benchmark, réduction à la dernière valeur connue de chaque mois puis
+# forward-fill sur les seules lignes mensuelles. Le panel quotidien complet
+# n'est jamais matérialisé en pandas.
+
+HAS_POLARS = pl is not None
+
+
+def _parquet(path):
+    # Copie Parquet du CSV triée par date (colonnaire + statistiques par bloc), régénérée si le CSV est plus récent
+    target = os.path.splitext(path)[0] + '.parquet'
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+        tmp = f"{target}.{os.getpid()}.tmp"
+        pl.scan_csv(path, try_parse_dates=True, infer_schema_length=10000).sort('Date').sink_parquet(tmp)
+        os.replace(tmp, target)
+    return target
+
+
+def scan_sp500(path=SP500_CSV, tickers=None):
+    if not os.path.exists(path):
+        return None
+    lf = pl.scan_parquet(_parquet(path))
+    if tickers is not None:
+        lf = lf.select(['Date', *tickers])
+    return lf.with_columns(pl.col('Date').cast(pl.Datetime('us')),
+                           pl.exclude('Date').cast(pl.Float64).fill_nan(None))
+
+
+def sp500_date_range(path=SP500_CSV):
+    # Bornes de dates du fichier sans charger les prix (statistiques Parquet)
+    lf = scan_sp500(path)
+    if lf is None:
+        return None
+    row = lf.select(pl.col('Date').min().alias('lo'), pl.col('Date').max().alias('hi')).collect()
+    return pd.Timestamp(row['lo'][0]), pd.Timestamp(row['hi'][0])
+
+
+def prepare_sp500_lazy(df_bench, start, end, path=SP500_CSV, tickers=None):
+    lf = scan_sp500(path, tickers)
+    if lf is None:
+        return None
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    bench = df_bench['^GSPC'].dropna().sort_index().loc[:end]
+    if bench.empty:
+        return pd.DataFrame(), pd.Series(dtype=float, name='^GSPC')
+    # prepare_sp500 écarte les lignes antérieures au premier ^GSPC (elles alimentent seulement le ffill)
+    start = max(start, bench.index[0])
+    bench = pl.LazyFrame({'Date': bench.index.to_numpy(), '^GSPC': bench.to_numpy(dtype=float)})
+    bench = bench.with_columns(pl.col('Date').cast(pl.Datetime('us')))
+
+    # 1. Union des lignes assets et benchmark, limitée à la date de fin (le ffill ne regarde que le passé).
+    # Concaténation plutôt que jointure : chaque colonne n'est renseignée que par une des deux sources,
+    # toutes deux triées par date, donc l'ordre des lignes d'une même date est indifférent.
+    combined = pl.concat([lf.filter(pl.col('Date') <= end), bench], how='diagonal')
+
+    # 2. Dernière valeur connue de chaque colonne par mois, avant tout ffill : les lignes quotidiennes sont
+    # réduites à une ligne par mois, et tout l'historique antérieur au début à une seule ligne (clé nulle)
+    month = pl.when(pl.col('Date') >= start).then(pl.col('Date').dt.month_end())
+    monthly = (
+        combined.group_by(month.alias('Date'), maintain_order=True)
+        .agg(pl.exclude('Date').drop_nulls().last())
+        # 3. Forward-fill sur les seules lignes mensuelles, amorcé par la ligne d'historique
+        .sort('Date', nulls_last=False)
+        .with_columns(pl.exclude('Date').forward_fill())
+        .drop_nulls('Date')
+        .collect(engine='streaming')
+    )
+    if monthly.height == 0:
+        return pd.DataFrame(), pd.Series(dtype=float, name='^GSPC')
+
+    # Conversion vers pandas via numpy (pas de dépendance à pyarrow) ; mois sans cotation réintroduits comme resample
+    name = 'Date' if df_bench.index.name == 'Date' else None  # nom d'index comme pd.concat
+    index = pd.DatetimeIndex(monthly['Date'].to_numpy(), name=name)
+    months = pd.date_range(index[0], index[-1], freq='ME', name=name)
+    assets = monthly.drop('Date', '^GSPC')
+    m_assets = pd.DataFrame(assets.to_numpy(), index=index, columns=assets.columns).reindex(months)
+    m_bench = pd.Series(monthly['^GSPC'].to_numpy(), index=index, name='^GSPC').reindex(months)
+    return m_assets, m_bench
@@ -0,0 +1,61 @@
+import os
+
+import pandas as pd
+import yfinance as yf
+
+from engine.benchmark import get_benchmark, with_benchmark
+
+# --- CHARGEMENT DES DONNÉES (SANS STREAMLIT) ---
+# Les pages enveloppent ces fonctions dans st.cache_data ; l'API locale les
+# appelle directement depuis ses workers.
+
+SP500_CSV = 'sp500_data_final.csv'
+
+
+def download_weekly_close(ticker, start, end):
+    # Téléchargement avec group_by pour stabiliser le format
+    df = yf.download(ticker, start=start, end=end, interval="1wk", group_by='column', progress=False)
+
+    if df.empty:
+        return None
+
+    # Nettoyage des colonnes (Gestion du bug MultiIndex de Yahoo Finance)
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+
+    # Vérification de sécurité
+    if 'Close' not in df.columns:
+        return None
+
+    df = df[['Close']].copy()
+    df.columns = ['price']
+    return df
+
+
+def load_universe(tickers, s_date, e_date, margin_days, bench):
+    # Panel Close / Open (ffill) d'un univers + colonnes du benchmark partagé
+    margin_start = pd.to_datetime(s_date) - pd.DateOffset(days=margin_days)
+    data = yf.download(tickers, start=margin_start, end=e_date, progress=False)
+
+    if data.empty: return pd.DataFrame(), pd.DataFrame()
+
+    if isinstance(data.columns, pd.MultiIndex):
+        closes = data['Adj Close'].ffill() if 'Adj Close' in data.columns.levels[0] else data['Close'].ffill()
+        opens = data['Open'].ffill()
+    else:
+        closes = data[['Adj Close']].ffill() if 'Adj Close' in data.columns else data[['Close']].ffill()
+        opens = data[['Open']].ffill()
+
+    # Benchmark servi par le service partagé (téléchargé une fois pour toutes les pages)
+    benchmark = get_benchmark(bench)
+    if benchmark is None: return pd.DataFrame(), pd.DataFrame()
+    return with_benchmark(closes, opens, bench, benchmark)
+
+
+def load_sp500_csv(path=SP500_CSV):
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path)
+    df['Date'] = pd.to_datetime(df['Date'])
+    df.set_index('Date', inplace=True)
+    return df.sort_index()
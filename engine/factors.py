@@ -0,0 +1,114 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# --- MATRICE DE FACTEURS MOMENTUM (mois × tickers × look-backs) ---
+# Calculée une fois par jeu de données : changer de look-back ou de définition
+# du momentum devient une simple lecture dans un tableau pré-calculé, et le
+# classement de chaque mois est lui aussi pré-trié.
+
+LOOKBACKS = range(1, 13)
+
+VARIANTS = {
+    "Rendement simple": "simple",
+    "Hors dernier mois (ex. 12-1)": "skip",
+    "Ajusté de la volatilité": "vol_adj",
+}
+
+
+class MomentumFactors:
+    """Cube de scores momentum + classements pré-triés, construits à la demande par variante."""
+
+    def __init__(self, monthly_close, lookbacks=LOOKBACKS):
+        self.index = monthly_close.index
+        self.tickers = monthly_close.columns
+        self.lookbacks = list(lookbacks)
+        self._lb_pos = {lb: k for k, lb in enumerate(self.lookbacks)}
+        self._prices = monthly_close.to_numpy(dtype=float)
+        self._cubes = {}
+        self._orders = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    # --- Construction des cubes ---
+    def _shifted(self, k):
+        out = np.full_like(self._prices, np.nan)
+        if k < len(self._prices):
+            out[k:] = self._prices[:len(self._prices) - k]
+        return out
+
+    def _build(self, variant):
+        n_months, n_tickers = self._prices.shape
+        cube = np.full((n_months, n_tickers, len(self.lookbacks)), np.nan)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if variant == "simple":
+                for k, lb in enumerate(self.lookbacks):
+                    cube[:, :, k] = self._prices / self._shifted(lb) - 1
+            elif variant == "skip":
+                # Performance de t-1-lb à t-1 : on ignore le dernier mois (retournement court terme)
+                last = self._shifted(1)
+                for k, lb in enumerate(self.lookbacks):
+                    cube[:, :, k] = last / self._shifted(1 + lb) - 1
+            elif variant == "vol_adj":
+                # Performance / volatilité des rendements mensuels sur la même fenêtre (3 mois minimum).
+                # Les écarts-types de toutes les fenêtres viennent des mêmes sommes cumulées.
+                rets = self._prices / self._shifted(1) - 1
+                valid = ~np.isnan(rets)
+                r = np.where(valid, rets, 0.0)
+                zero = np.zeros((1, n_tickers))
+                s1 = np.vstack([zero, np.cumsum(r, axis=0)])
+                s2 = np.vstack([zero, np.cumsum(r * r, axis=0)])
+                cnt = np.vstack([zero, np.cumsum(valid, axis=0)])
+                for k, lb in enumerate(self.lookbacks):
+                    w = max(lb, 3)
+                    if w >= n_months:
+                        continue
+                    n = cnt[w + 1:] - cnt[1:-w]
+                    m1 = s1[w + 1:] - s1[1:-w]
+                    m2 = s2[w + 1:] - s2[1:-w]
+                    var = (m2 - m1 * m1 / w) / (w - 1)
+                    vol = np.full_like(self._prices, np.nan)
+                    vol[w:] = np.where(n == w, np.sqrt(np.clip(var, 0.0, None)), np.nan)
+                    cube[:, :, k] = (self._prices / self._shifted(lb) - 1) / vol
+                cube[~np.isfinite(cube)] = np.nan
+            else:
+                raise ValueError(f"Définition de momentum inconnue : {variant}")
+
+        # Classement pré-trié (score décroissant, NaN en fin de liste)
+        order = np.argsort(np.where(np.isnan(cube), np.inf, -cube), axis=1, kind='stable')
+        self._cubes[variant] = cube
+        self._orders[variant] = order
+        self._counts[variant] = (~np.isnan(cube)).sum(axis=1)
+
+    def _ensure(self, variant):
+        # Verrou : la construction peut être demandée par les threads de précalcul
+        with self._lock:
+            if variant not in self._orders:
+                self._build(variant)
+
+    # --- Lectures ---
+    def scores(self, lookback, variant="simple"):
+        self._ensure(variant)
+        return pd.DataFrame(self._cubes[variant][:, :, self._lb_pos[lookback]], index=self.index, columns=self.tickers)
+
+    def ranking(self, i, lookback, variant="simple"):
+        # Tickers du mois i, triés par score décroissant (scores manquants exclus)
+        self._ensure(variant)
+        k = self._lb_pos[lookback]
+        count = self._counts[variant][i, k]
+        return self.tickers[self._orders[variant][i, :count, k]].tolist()
+
+    def top(self, i, lookback, n, variant="simple"):
+        return self.ranking(i, lookback, variant)[:n]
+
+    def rank_matrix(self, lookback, variant="simple"):
+        # Rang (0 = meilleur) de chaque ticker pour chaque mois ; NaN si pas de score
+        self._ensure(variant)
+        k = self._lb_pos[lookback]
+        order = self._orders[variant][:, :, k]
+        ranks = np.empty(order.shape, dtype=float)
+        np.put_along_axis(ranks, order, np.arange(order.shape[1], dtype=float)[None, :].repeat(order.shape[0], 0), axis=1)
+        ranks[np.isnan(self._cubes[variant][:, :, k])] = np.nan
+        return pd.DataFrame(ranks, index=self.index, columns=self.tickers)
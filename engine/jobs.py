@@ -0,0 +1,223 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from engine.benchmark import get_benchmark
+from engine.chunked import MEMORY_MB, open_sp500_store, scan_rsi_chunked
+from engine.columnar import HAS_POLARS, prepare_sp500_lazy, sp500_date_range
+from engine.data import download_weekly_close, load_sp500_csv, load_universe
+from engine.factors import MomentumFactors
+from engine.momentum import (backtest_extended_universe, backtest_sector_rotation, backtest_sp500,
+                             backtest_top_stocks, build_factors, prepare_sp500)
+from engine.rsi_modes import MODE_DEFAULTS, compute_rsi_mode, scan_rsi_modes
+from engine.universes import EXTENDED_UNIVERSE, SECTORS, TOP_30
+
+# --- TRAVAUX DE BACKTEST POUR L'API LOCALE ---
+# Fonctions pures exécutées dans les processus workers de api.py. Paramètres et
+# valeurs par défaut identiques aux pages ; les résultats sont sérialisables en JSON.
+
+RSI_DEFAULTS = dict(ticker="^GSPC", start="1960-01-01", end="2025-12-31", fees=0.1, **MODE_DEFAULTS)
+RSI_SCAN_DEFAULTS = dict(tickers=["^GSPC"], start="1960-01-01", end="2025-12-31", fees=0.1, grid=[{}],
+                         universe=None, top=None, memory_mb=MEMORY_MB)
+
+MOMENTUM = {
+    "sectors": dict(fn=backtest_sector_rotation, universe=SECTORS, extra=[], bench="SPY",
+                    margin_days=max(12 * 31, 250) + 60,
+                    defaults=dict(start="1999-01-01", end="2026-12-31", n_top=2, lookback=6, holding=9, sma=150)),
+    "top30": dict(fn=backtest_top_stocks, universe=TOP_30, extra=[], bench="^GSPC",
+                  margin_days=max(12 * 31, 250) + 100,
+                  defaults=dict(start="1990-01-01", end=None, n_top=5, lookback=6, holding=1, sma=200)),
+    "extended": dict(fn=backtest_extended_universe, universe=EXTENDED_UNIVERSE, extra=["SHY"], bench="^GSPC",
+                     margin_days=250 + 180,
+                     defaults=dict(start="1960-01-01", end=None, n_top=5, lookback=6, holding=1, sma=200)),
+}
+MOMENTUM_COMMON = dict(fees=0.1, timing=True, variant="simple", weighting="equal")
+SP500_DEFAULTS = dict(start=None, end=None, lookback=6, holding=1, n=10, ma_window=10, variant="simple", weighting="equal")
+
+STRATEGIES = ["rsi", "rsi_scan", *MOMENTUM, "sp500"]
+
+
+def summary(returns, periods_per_year, risk_free_rate=0.0):
+    r = returns.dropna()
+    if r.empty:
+        return {}
+    cum = (1 + r).cumprod()
+    years = (r.index[-1] - r.index[0]).days / 365.25
+    vol = r.std() * np.sqrt(periods_per_year)
+    return {
+        "total_return": float(cum.iloc[-1] - 1),
+        "cagr": float(cum.iloc[-1] ** (1 / years) - 1) if years > 0 else 0.0,
+        "volatility": float(vol),
+        "sharpe": float((r.mean() * periods_per_year - risk_free_rate) / vol) if vol > 0 else 0.0,
+        "max_drawdown": float((cum / cum.cummax() - 1).min()),
+    }
+
+
+def _series(frame):
+    return {
+        "dates": [d.strftime("%Y-%m-%d") for d in frame.index],
+        **{col: [None if pd.isna(v) else float(v) for v in frame[col]] for col in frame.columns},
+    }
+
+
+def _merge(defaults, params):
+    unknown = set(params) - set(defaults)
+    if unknown:
+        raise ValueError(f"Paramètres inconnus : {', '.join(sorted(unknown))}")
+    return {**defaults, **params}
+
+
+def _today():
+    return pd.Timestamp.today().strftime("%Y-%m-%d")
+
+
+def normalize(strategy, params):
+    # Paramètres complets (valeurs par défaut fusionnées, fin par défaut résolue) : deux requêtes
+    # qui lancent le même calcul ont la même forme normalisée (clé de coalescence de l'API)
+    if strategy == "rsi":
+        return _merge(RSI_DEFAULTS, params)
+    if strategy == "rsi_scan":
+        p = _merge(RSI_SCAN_DEFAULTS, params)
+        return {**p, "grid": [_merge(MODE_DEFAULTS, g) for g in p["grid"]]}
+    if strategy == "sp500":
+        return _merge(SP500_DEFAULTS, params)
+    if strategy in MOMENTUM:
+        p = _merge({**MOMENTUM[strategy]["defaults"], **MOMENTUM_COMMON}, params)
+        p["end"] = p["end"] or _today()
+        return p
+    raise ValueError(f"Stratégie inconnue : {strategy}")
+
+
+# --- Caches par processus worker (les données ne dépendent que des dates) ---
+@lru_cache(maxsize=8)
+def _weekly(ticker, start, end):
+    return download_weekly_close(ticker, start, end)
+
+
+@lru_cache(maxsize=8)
+def _universe(name, start, end):
+    spec = MOMENTUM[name]
+    closes, opens = load_universe(spec["universe"] + spec["extra"], start, end,
+                                  margin_days=spec["margin_days"], bench=spec["bench"])
+    if closes.empty:
+        raise ValueError("Aucune donnée récupérée.")
+    return closes, opens, build_factors(closes, spec["universe"])
+
+
+@lru_cache(maxsize=4)
+def _sp500(start, end):
+    # Moteur colonnaire lazy si polars est installé, sinon chargement pandas complet
+    if HAS_POLARS:
+        date_range = sp500_date_range()
+    else:
+        assets = load_sp500_csv()
+        date_range = None if assets is None else (assets.index.min(), assets.index.max())
+    if date_range is None:
+        raise ValueError("Fichier 'sp500_data_final.csv' introuvable.")
+    start = start or date_range[0].strftime("%Y-%m-%d")
+    end = end or date_range[1].strftime("%Y-%m-%d")
+    gspc, _ = get_benchmark("^GSPC").frame("^GSPC")
+    gspc = gspc.loc[pd.Timestamp(start):pd.Timestamp(end)]
+    if HAS_POLARS:
+        m_assets, m_bench = prepare_sp500_lazy(gspc, start, end)
+    else:
+        m_assets, m_bench = prepare_sp500(assets, gspc, start, end)
+    return m_assets, m_bench, MomentumFactors(m_assets)
+
+
+def run_rsi(params):
+    p = normalize("rsi", params)
+    prices = _weekly(p["ticker"], p["start"], p["end"])
+    if prices is None:
+        raise ValueError("Données indisponibles.")
+    # Avec les paramètres par défaut, compute_rsi_mode donne exactement le masque de app.py
+    df = compute_rsi_mode(prices, p["fees"] / 100, p["th_buy"], p["th_panic"], p["period"], p["th_exit"],
+                          p["trail_stop"], p["min_hold"], p["cooldown"])
+    return {
+        "strategy": "rsi",
+        "params": p,
+        "metrics": {"strategy": summary(df["net_ret"], 52), "benchmark": summary(df["mkt_ret"], 52)},
+        "trades": int(df["trade"].sum()),
+        "series": _series(df[["cum_strat", "cum_mkt"]]),
+    }
+
+
+def run_rsi_scan(params):
+    # Tous les tickers × jeux de paramètres en un seul appel aux noyaux compilés
+    p = normalize("rsi_scan", params)
+    if p["universe"] == "sp500":
+        # Panel quotidien du CSV local lu par blocs de tickers depuis le disque
+        store = open_sp500_store(memory_mb=p["memory_mb"])
+        if store is None:
+            raise ValueError("Fichier 'sp500_data_final.csv' introuvable.")
+        table = scan_rsi_chunked(store, p["grid"], p["fees"] / 100, periods_per_year=252,
+                                 memory_mb=p["memory_mb"], top=p["top"])
+    elif p["universe"] is not None:
+        raise ValueError(f"Univers inconnu : {p['universe']}")
+    else:
+        closes = {t: _weekly(t, p["start"], p["end"]) for t in p["tickers"]}
+        closes = {t: df["price"] for t, df in closes.items() if df is not None}
+        if not closes:
+            raise ValueError("Données indisponibles.")
+        table = scan_rsi_modes(pd.DataFrame(closes), p["grid"], p["fees"] / 100)
+        if p["top"]:
+            table = table.nlargest(p["top"], "sharpe").reset_index(drop=True)
+    return {
+        "strategy": "rsi_scan",
+        "params": p,
+        "results": table.astype(object).where(table.notna(), None).to_dict(orient="records"),
+    }
+
+
+def run_momentum(name, params):
+    spec = MOMENTUM[name]
+    p = normalize(name, params)
+    closes, opens, factors = _universe(name, p["start"], p["end"])
+    result = spec["fn"](closes, opens, spec["universe"], p["start"], p["n_top"], p["lookback"], p["holding"],
+                        p["fees"] / 100, p["timing"], p["sma"], factors=factors, variant=p["variant"],
+                        trend=get_benchmark(spec["bench"]).trend(p["sma"]), weighting=p["weighting"])
+    if result is None:
+        raise ValueError("Données insuffisantes.")
+    returns = result["returns"]
+    strat_col, bench_col = returns.columns[0], "S&P 500"
+    return {
+        "strategy": name,
+        "params": p,
+        "metrics": {"strategy": summary(returns[strat_col], 12), "benchmark": summary(returns[bench_col], 12)},
+        "trades": int(result["trades"]),
+        "holdings": list(result["holdings"]),
+        "positions": result["positions"],
+        "series": _series((1 + returns).cumprod()),
+    }
+
+
+def run_sp500(params):
+    p = normalize("sp500", params)
+    m_assets, m_bench, factors = _sp500(p["start"], p["end"])
+    trend = get_benchmark("^GSPC").monthly().trend(p["ma_window"])
+    result = backtest_sp500(m_assets, m_bench, p["lookback"], p["holding"], p["n"], p["ma_window"],
+                            factors=factors, variant=p["variant"], trend=trend, weighting=p["weighting"])
+    if result is None:
+        raise ValueError("Données insuffisantes. Essayez d'élargir la période de dates.")
+    cum_s, cum_b, ret_s, ret_b, trend_bits = result
+    return {
+        "strategy": "sp500",
+        "params": p,
+        "metrics": {"strategy": summary(ret_s, 12), "benchmark": summary(ret_b, 12)},
+        "exposure": [int(b) for b in trend_bits],
+        "series": _series(pd.DataFrame({"Stratégie": cum_s, "S&P 500": cum_b})),
+    }
+
+
+def run_job(strategy, params):
+    # Point d'entrée unique (picklable) exécuté dans le pool de processus
+    if strategy == "rsi":
+        return run_rsi(params)
+    if strategy == "rsi_scan":
+        return run_rsi_scan(params)
+    if strategy == "sp500":
+        return run_sp500(params)
+    if strategy in MOMENTUM:
+        return run_momentum(strategy, params)
+    raise ValueError(f"Stratégie inconnue : {strategy}")
@@ -0,0 +1,324 @@
+import numpy as np
+import pandas as pd
+
+from engine.factors import MomentumFactors
+from engine.weights import Weigher
+
+# --- BACKTESTS MOMENTUM (CALCUL PUR, SANS STREAMLIT) ---
+# Les boucles de rotation des pages, extraites pour pouvoir être exécutées
+# hors du script Streamlit (précalcul en arrière-plan, etc.).
+# Le classement momentum est lu dans un MomentumFactors pré-calculé (passé par
+# la page, qui le met en cache) ; à défaut il est construit à la volée.
+# `weighting` choisit la pondération du top-N (voir engine.weights) ; la
+# covariance est mise à jour de proche en proche sur `cov_window` lignes.
+
+
+def build_factors(close_data, tickers):
+    return MomentumFactors(close_data[tickers].resample('ME').last())
+
+
+def sma_trend(prices, window):
+    # Filtre de tendance local (quand la page ne fournit pas celui du service benchmark)
+    return prices > prices.rolling(window=window).mean()
+
+
+def _is_bull(trend, dt):
+    idx = trend.index.get_indexer([dt], method='ffill')[0]
+    return bool(trend.iloc[idx]) if idx >= 0 else False
+
+
+def backtest_sector_rotation(close_data, open_data, sectors, start_date, n_top, lookback, holding_period,
+                             fees_pct, use_market_timing, sma_period, bench='SPY', factors=None, variant='simple',
+                             trend=None, weighting='equal', cov_window=126):
+    if trend is None:
+        trend = sma_trend(close_data[bench], sma_period)
+    if factors is None:
+        factors = build_factors(close_data, sectors)
+    months = factors.index
+    weigher = Weigher(close_data[sectors], weighting, cov_window)
+    weights = {}
+
+    history = []
+    pos_history = []
+    portfolio_changes = 0
+    current_top = []
+    is_invested = False
+
+    start_dt = pd.to_datetime(start_date)
+    valid_start_idx = lookback
+    for j in range(len(months)):
+        if months[j] >= start_dt and j >= lookback:
+            valid_start_idx = j
+            break
+
+    for i in range(valid_start_idx, len(months) - 1):
+        monthly_fees = 0
+        dt_now = months[i]
+
+        market_is_bull = _is_bull(trend, dt_now) if use_market_timing else True
+
+        if (i - valid_start_idx) % holding_period == 0:
+            new_top = factors.top(i, lookback, n_top, variant)
+            if is_invested and current_top:
+                num_changes = len([s for s in new_top if s not in current_top])
+                portfolio_changes += num_changes
+                monthly_fees += (num_changes / n_top) * fees_pct
+            current_top = new_top
+            # Pondération égale : 1 / n_top par secteur (la part non allouée reste en cash)
+            weights = {t: 1 / n_top for t in current_top} if weighting == 'equal' else weigher(dt_now, current_top)
+
+            pos_history.append({
+                'Période': dt_now.strftime('%b %Y'),
+                'État': "INVESTI" if market_is_bull else "CASH (Sécurité)",
+                'Tickers': ", ".join(current_top) if market_is_bull else "---"
+            })
+
+        if market_is_bull and not is_invested:
+            is_invested = True
+            portfolio_changes += len(current_top)
+            monthly_fees += fees_pct
+        elif not market_is_bull and is_invested:
+            is_invested = False
+            portfolio_changes += len(current_top)
+            monthly_fees += fees_pct
+
+        d_start, d_end = months[i] + pd.Timedelta(days=1), months[i+1]
+        try:
+            idx_s = open_data.index.get_indexer([d_start], method='bfill')[0]
+            idx_e = close_data.index.get_indexer([d_end], method='ffill')[0]
+            gross_ret = sum(weights[t] * ((close_data[t].iloc[idx_e] / open_data[t].iloc[idx_s]) - 1) for t in current_top) if is_invested else 0.0
+            history.append({
+                'Date': months[i+1],
+                'Ma Stratégie': gross_ret - monthly_fees,
+                'S&P 500': (close_data[bench].iloc[idx_e] / open_data[bench].iloc[idx_s]) - 1
+            })
+        except: continue
+
+    return {
+        'returns': pd.DataFrame(history).set_index('Date'),
+        'positions': pos_history,
+        'trades': portfolio_changes,
+        'invested': is_invested,
+        'holdings': current_top,
+    }
+
+
+def backtest_top_stocks(close_data, open_data, tickers_list, start_date, n_top, lookback, holding_period,
+                        fees_pct, use_market_timing, sma_period, bench='^GSPC', factors=None, variant='simple',
+                        trend=None, weighting='equal', cov_window=126):
+    if trend is None:
+        trend = sma_trend(close_data[bench], sma_period)
+    if factors is None:
+        factors = build_factors(close_data, tickers_list)
+    months = factors.index
+    weigher = Weigher(close_data[tickers_list], weighting, cov_window)
+    weights = {}
+
+    history = []
+    pos_history = []
+    is_invested = False
+    current_top = []
+    portfolio_changes = 0
+
+    start_dt = pd.to_datetime(start_date)
+    valid_idx = [i for i, idx in enumerate(months) if idx >= start_dt and i >= lookback]
+
+    if not valid_idx:
+        return None
+
+    for i in range(valid_idx[0], len(months) - 1):
+        dt_now = months[i]
+        monthly_fees = 0.0
+
+        market_is_bull = _is_bull(trend, dt_now) if use_market_timing else True
+
+        # --- Logique de Rotation ---
+        if (i - valid_idx[0]) % holding_period == 0:
+            new_top = factors.top(i, lookback, n_top, variant)
+
+            if is_invested and current_top:
+                to_sell = [s for s in current_top if s not in new_top]
+                to_buy = [s for s in new_top if s not in current_top]
+
+                num_transac_rotation = len(to_sell) + len(to_buy)
+                portfolio_changes += num_transac_rotation
+                monthly_fees += (num_transac_rotation / n_top) * fees_pct
+
+            current_top = new_top
+            weights = weigher(dt_now, current_top)
+            pos_history.append({
+                'Période': dt_now.strftime('%Y-%m'),
+                'État': "INVESTI" if market_is_bull and current_top else "CASH",
+                'Tickers': ", ".join(current_top) if market_is_bull and current_top else "---"
+            })
+
+        # --- Logique de Market Timing ---
+        was_invested = is_invested
+        is_invested = market_is_bull and len(current_top) > 0
+
+        if is_invested and not was_invested:
+            portfolio_changes += len(current_top)
+            monthly_fees += fees_pct
+        elif not is_invested and was_invested:
+            portfolio_changes += len(current_top)
+            monthly_fees += fees_pct
+
+        # --- Calcul des rendements ---
+        d_start, d_end = months[i] + pd.Timedelta(days=1), months[i+1]
+        try:
+            idx_s = open_data.index.get_indexer([d_start], method='bfill')[0]
+            idx_e = close_data.index.get_indexer([d_end], method='ffill')[0]
+
+            if is_invested:
+                raw_ret = sum(weights[t] * ((close_data[t].iloc[idx_e] / open_data[t].iloc[idx_s]) - 1) for t in current_top)
+                ret_strat = raw_ret - monthly_fees
+            else:
+                ret_strat = 0.0 - monthly_fees
+
+            ret_bench = (close_data[bench].iloc[idx_e] / open_data[bench].iloc[idx_s]) - 1
+            history.append({'Date': months[i+1], 'Ma Stratégie': ret_strat, 'S&P 500': ret_bench})
+        except: continue
+
+    return {
+        'returns': pd.DataFrame(history).set_index('Date'),
+        'positions': pos_history,
+        'trades': portfolio_changes,
+        'invested': is_invested,
+        'holdings': current_top,
+    }
+
+
+def backtest_extended_universe(close_data, open_data, extended_universe, start_date, n_top, lookback, holding_period,
+                               fees_pct, use_market_timing, sma_period, bench='^GSPC', cash='SHY',
+                               factors=None, variant='simple', trend=None, weighting='equal', cov_window=126):
+    if trend is None:
+        trend = sma_trend(close_data[bench], sma_period)
+    if factors is None:
+        factors = build_factors(close_data, extended_universe)
+    months = factors.index
+    weigher = Weigher(close_data[extended_universe], weighting, cov_window)
+    weights = {}
+
+    history = []
+    pos_history = []
+    current_top = []
+    portfolio_changes = 0
+
+    start_dt = pd.to_datetime(start_date)
+
+    for i in range(len(months) - 1):
+        dt_now = months[i]
+        if dt_now < start_dt: continue
+
+        dt_next = months[i+1]
+        monthly_fees = 0.0
+
+        idx_ref = close_data.index.get_indexer([dt_now], method='pad')[0]
+        market_is_bull = _is_bull(trend, dt_now) if use_market_timing else True
+
+        # --- Rotation Logique et Journalisation ---
+        if (i % holding_period == 0):
+            present_tickers = set(close_data.iloc[idx_ref][extended_universe].dropna().index)
+            if present_tickers:
+                ranking = factors.ranking(i, lookback, variant)
+                new_ranking = [t for t in ranking if t in present_tickers][:n_top]
+
+                if current_top:
+                    to_sell = [s for s in current_top if s not in new_ranking]
+                    to_buy = [s for s in new_ranking if s not in current_top]
+                    current_top = [s for s in current_top if s in new_ranking] + to_buy[:n_top-len([s for s in current_top if s in new_ranking])]
+
+                    change_count = len(to_sell) + len(to_buy)
+                    portfolio_changes += change_count
+                    monthly_fees += (change_count / n_top) * fees_pct
+                else:
+                    current_top = new_ranking
+                    portfolio_changes += len(current_top)
+                    monthly_fees += fees_pct
+                weights = weigher(dt_now, current_top)
+
+            # On ajoute la ligne au journal des positions
+            pos_history.append({
+                'Période': dt_now.strftime('%Y-%m'),
+                'État Marché': "HAUSSIER" if market_is_bull else "PRUDENCE",
+                'Allocation': "ACTIONS" if market_is_bull else "CASH/SHY",
+                'Tickers Sélectionnés': ", ".join(current_top) if (market_is_bull and current_top) else "---"
+            })
+
+        # Calcul performance
+        idx_s = open_data.index.get_indexer([dt_now], method='bfill')[0]
+        idx_e = close_data.index.get_indexer([dt_next], method='ffill')[0]
+
+        if market_is_bull and current_top:
+            month_rets = (close_data[current_top].iloc[idx_e] / open_data[current_top].iloc[idx_s]) - 1
+            if weighting == 'equal':
+                ret_strat = month_rets.mean() - monthly_fees
+            else:
+                ret_strat = (month_rets * pd.Series(weights)).sum() - monthly_fees
+        else:
+            shy_val = (close_data[cash].iloc[idx_e] / open_data[cash].iloc[idx_s]) - 1
+            ret_strat = (shy_val if not np.isnan(shy_val) else 0.0) - monthly_fees
+
+        ret_bench = (close_data[bench].iloc[idx_e] / open_data[bench].iloc[idx_s]) - 1
+        history.append({'Date': dt_next, 'Stratégie': ret_strat, 'S&P 500': ret_bench})
+
+    return {
+        'returns': pd.DataFrame(history).set_index('Date'),
+        'positions': pos_history,
+        'trades': portfolio_changes,
+        'holdings': current_top,
+    }
+
+
+def prepare_sp500(assets, df_bench, start, end):
+    # 1. Alignement des données
+    combined = pd.concat([assets, df_bench], axis=1).ffill().dropna(subset=['^GSPC'])
+    combined = combined.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+    benchmark_prices = combined['^GSPC']
+    asset_prices = combined.drop(columns=['^GSPC'])
+
+    # 2. Resample mensuel
+    m_assets = asset_prices.resample('ME').last()
+    m_bench = benchmark_prices.resample('ME').last()
+    return m_assets, m_bench
+
+
+def backtest_sp500(m_assets, m_bench, lb, hold, n, ma_win, factors=None, variant='simple', trend=None,
+                   weighting='equal', cov_window=36):
+    if factors is None:
+        factors = MomentumFactors(m_assets)
+    weigher = Weigher(m_assets, weighting, cov_window)
+
+    # 3. Calcul MM et Signaux
+    if trend is None:
+        trend = sma_trend(m_bench, ma_win)
+    returns_assets = m_assets.pct_change()
+    returns_bench = m_bench.pct_change()
+
+    strat_returns, dates, trend_bits = [], [], []
+    start_idx = max(lb, ma_win)
+
+    for i in range(start_idx, len(m_assets) - hold, hold):
+        current_date = m_assets.index[i]
+
+        # Filtre de tendance sur le S&P 500 téléchargé
+        if _is_bull(trend, current_date):
+            top_n = factors.top(i, lb, n, variant)
+            if weighting == 'equal':
+                future_perf = returns_assets.iloc[i+1 : i+1+hold][top_n].mean(axis=1)
+            else:
+                future_perf = (returns_assets.iloc[i+1 : i+1+hold][top_n] * pd.Series(weigher(current_date, top_n))).sum(axis=1)
+            trend_bits.extend([1] * len(future_perf))
+        else:
+            future_perf = pd.Series(0, index=returns_assets.index[i+1 : i+1+hold])
+            trend_bits.extend([0] * len(future_perf))
+
+        strat_returns.extend(future_perf.values)
+        dates.extend(future_perf.index)
+
+    if not strat_returns: return None
+
+    s_strat = pd.Series(strat_returns, index=dates)
+    s_bench = returns_bench.loc[dates]
+    return (1 + s_strat).cumprod(), (1 + s_bench).cumprod(), s_strat, s_bench, trend_bits
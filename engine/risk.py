@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# --- MÉTRIQUES DE RISQUE GLISSANTES EN O(n) ---
+# Toutes les fenêtres sont servies à partir d'une seule passe de sommes
+# cumulées (Σx, Σx², Σxy) : une statistique sur [i-w+1, i] est une simple
+# différence S[i] - S[i-w], sans re-découper la série pour chaque fenêtre.
+
+ROLLING_WINDOWS = {"1 an": 1, "3 ans": 3, "5 ans": 5}
+
+
+def _window_diff(cum, w):
+    # Somme glissante sur w points à partir d'un tableau de sommes cumulées (avec un 0 en tête)
+    out = np.full(cum.shape[0] - 1, np.nan) if cum.ndim == 1 else np.full((cum.shape[0] - 1, cum.shape[1]), np.nan)
+    if w < cum.shape[0]:
+        out[w - 1:] = cum[w:] - cum[:-w]
+    return out
+
+
+def _rolling_max(values, w):
+    # Maximum glissant en O(n) (van Herk / Gil-Werman) : max préfixe et max suffixe par blocs de w
+    n, k = values.shape
+    if w <= 1:
+        return values.copy()
+    out = np.full((n, k), np.nan)
+    if w > n:
+        return out
+    pad = (-n) % w
+    padded = np.vstack([values, np.full((pad, k), -np.inf)]).reshape(-1, w, k)
+    prefix = np.maximum.accumulate(padded, axis=1).reshape(-1, k)[:n]
+    suffix = np.maximum.accumulate(padded[:, ::-1], axis=1)[:, ::-1].reshape(-1, k)[:n]
+    out[w - 1:] = np.maximum(suffix[:n - w + 1], prefix[w - 1:])
+    return out
+
+
+class RollingRisk:
+    """Sommes cumulées d'un panel de rendements + benchmark, calculées une fois.
+
+    Les métriques pour n'importe quelle fenêtre (en nombre de points) sont
+    ensuite obtenues en O(n) sans nouvelle passe sur les données brutes.
+    """
+
+    def __init__(self, returns, bench, periods_per_year):
+        returns = returns.astype(float).fillna(0.0)
+        bench = bench.reindex(returns.index).astype(float).fillna(0.0)
+        self.index = returns.index
+        self.columns = returns.columns
+        self.periods_per_year = periods_per_year
+
+        x = returns.to_numpy()
+        y = bench.to_numpy()
+        # Centrage : variance et covariance sont invariantes par translation,
+        # et les sommes de carrés restent petites (pas de perte de précision)
+        self._x_shift = x.mean(axis=0)
+        self._y_shift = y.mean()
+        xc = x - self._x_shift
+        yc = (y - self._y_shift)[:, None]
+
+        zero = np.zeros((1, x.shape[1]))
+        self._sx = np.vstack([zero, np.cumsum(xc, axis=0)])
+        self._sxx = np.vstack([zero, np.cumsum(xc * xc, axis=0)])
+        self._sxy = np.vstack([zero, np.cumsum(xc * yc, axis=0)])
+        self._sy = np.concatenate([[0.0], np.cumsum(yc[:, 0])])
+        self._syy = np.concatenate([[0.0], np.cumsum(yc[:, 0] ** 2)])
+        self._log_wealth = np.cumsum(np.log1p(x), axis=0)
+
+    def _frame(self, values):
+        return pd.DataFrame(values, index=self.index, columns=self.columns)
+
+    def mean(self, w):
+        return _window_diff(self._sx, w) / w + self._x_shift
+
+    def volatility(self, w):
+        sx = _window_diff(self._sx, w)
+        var = (_window_diff(self._sxx, w) - sx * sx / w) / (w - 1)
+        return np.sqrt(np.clip(var, 0.0, None)) * np.sqrt(self.periods_per_year)
+
+    def sharpe(self, w, risk_free_rate=0.0):
+        vol = self.volatility(w)
+        excess = self.mean(w) * self.periods_per_year - risk_free_rate
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(vol > 0, excess / vol, np.nan)
+
+    def beta(self, w):
+        sx = _window_diff(self._sx, w)
+        sy = _window_diff(self._sy, w)[:, None]
+        cov = _window_diff(self._sxy, w) - sx * sy / w
+        var_y = _window_diff(self._syy, w)[:, None] - sy * sy / w
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(var_y > 0, cov / var_y, np.nan)
+
+    def drawdown(self, w):
+        # Drawdown par rapport au plus haut de la fenêtre glissante (en log-richesse)
+        peak = _rolling_max(self._log_wealth, w)
+        return np.expm1(self._log_wealth - peak)
+
+    def metrics(self, w, risk_free_rate=0.0):
+        return {
+            "Sharpe": self._frame(self.sharpe(w, risk_free_rate)),
+            "Volatilité": self._frame(self.volatility(w)),
+            "Drawdown": self._frame(self.drawdown(w)),
+            "Beta": self._frame(self.beta(w)),
+        }
+
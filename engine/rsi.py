@@ -0,0 +1,35 @@
+# --- STRATÉGIE RSI (CALCUL PUR, SANS STREAMLIT) ---
+def compute_rsi(price, period):
+    # RSI à moyennes simples ; accepte une série ou un panel (une colonne par ticker)
+    delta = price.diff()
+    gain = delta.clip(lower=0)
+    loss = -delta.clip(upper=0)
+    avg_gain = gain.rolling(window=period).mean()
+    avg_loss = loss.rolling(window=period).mean()
+    rs = avg_gain / avg_loss
+    return 100 - (100 / (1 + rs))
+
+
+def strategy_returns(df, fees):
+    # Rendements à partir de la colonne 'signal' (position tenue la barre suivante, frais à chaque changement)
+    df['mkt_ret'] = df['price'].pct_change()
+    df['strat_ret_raw'] = df['signal'].shift(1) * df['mkt_ret']
+    df['trade'] = df['signal'].diff().fillna(0).abs()
+    df['net_ret'] = df['strat_ret_raw'] - (df['trade'] * fees)
+
+    df['cum_mkt'] = (1 + df['mkt_ret'].fillna(0)).cumprod()
+    df['cum_strat'] = (1 + df['net_ret'].fillna(0)).cumprod()
+    return df
+
+
+def compute_rsi_strategy(prices, fees, th_buy, th_panic, period):
+    df = prices[['price']].copy()
+
+    # Calcul RSI
+    df['rsi'] = compute_rsi(df['price'], period)
+
+    # Signaux et Rendements
+    df['signal'] = 0
+    df.loc[(df['rsi'] >= th_buy) | (df['rsi'] < th_panic), 'signal'] = 1
+
+    return strategy_returns(df, fees)
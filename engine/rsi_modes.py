@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+from engine.rsi import compute_rsi, strategy_returns
+
+try:
+    from numba import njit, prange
+except ImportError:  # Sans numba (requirements.txt) : mêmes noyaux en Python pur, résultats identiques mais bien plus lents
+    prange = range
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda fn: fn
+
+# --- STRATÉGIES RSI AVEC ÉTAT (HYSTÉRÉSIS, STOP SUIVEUR, DURÉE MINIMALE, COOLDOWN) ---
+# Le signal dépend de la position courante : il est calculé par une boucle sur
+# les barres, compilée par numba. Un seul appel balaie tous les tickers × jeux
+# de paramètres en parallèle (un noyau par couple), sans boucle Python.
+#
+# Règles (barre t, signal tenu à la barre t+1 comme pour le masque classique) :
+#   - entrée si RSI >= th_buy (tendance) ou RSI < th_panic (panique) ;
+#   - sortie si RSI < th_exit et RSI >= th_panic, après au moins min_hold barres ;
+#   - stop suiveur : sortie si le prix recule de trail_stop depuis son plus haut
+#     en position (prioritaire sur min_hold) ;
+#   - cooldown : aucune entrée pendant `cooldown` barres après une sortie sur stop.
+# Avec th_exit = th_buy, trail_stop = 0, min_hold = 1 et cooldown = 0 on retrouve
+# exactement le masque de compute_rsi_strategy.
+
+HAS_NUMBA = prange is not range
+NUMBA_WARNING = "numba n'est pas installé : modes RSI avec état et scanner exécutés en Python pur (bien plus lents). pip install numba"
+
+MODE_DEFAULTS = dict(period=10, th_buy=50, th_exit=None, th_panic=32, trail_stop=0.0, min_hold=1, cooldown=0)
+METRICS = ["total_return", "cagr", "volatility", "sharpe", "max_drawdown", "trades", "exposure"]
+
+
+@njit(cache=True)
+def _signal_path(rsi, price, th_buy, th_exit, th_panic, trail_stop, min_hold, cooldown, sig):
+    pos, held, cool = 0, 0, 0
+    peak = 0.0
+    for t in range(rsi.shape[0]):
+        r = rsi[t]
+        if pos == 1:
+            held += 1
+            if price[t] > peak:
+                peak = price[t]
+            if trail_stop > 0 and price[t] <= peak * (1 - trail_stop):
+                pos, cool = 0, cooldown
+            elif held >= min_hold and not (r >= th_exit or r < th_panic):
+                pos = 0
+        elif cool > 0:
+            cool -= 1
+        elif r >= th_buy or r < th_panic:
+            pos, held, peak = 1, 0, price[t]
+        sig[t] = pos
+
+
+@njit(parallel=True, cache=True)
+def _scan(rsi, price, ret, p_idx, th_buy, th_exit, th_panic, trail_stop, min_hold, cooldown, fees, out):
+    # rsi : (périodes, tickers, barres) ; price / ret : (tickers, barres) ; out : (jeux, tickers, 6)
+    n_sets, n_tickers, n_bars = len(p_idx), price.shape[0], price.shape[1]
+    for k in prange(n_sets * n_tickers):
+        i, j = k // n_tickers, k % n_tickers
+        sig = np.empty(n_bars, np.int8)
+        _signal_path(rsi[p_idx[i], j], price[j], th_buy[i], th_exit[i], th_panic[i],
+                     trail_stop[i], min_hold[i], cooldown[i], sig)
+
+        wealth, peak, mdd = 1.0, 1.0, 0.0
+        s1, s2, cnt, trades, exposure = 0.0, 0.0, 0, 0.0, 0.0
+        for t in range(n_bars):
+            exposure += sig[t]
+            if t == 0:
+                continue
+            trade = abs(sig[t] - sig[t - 1])
+            trades += trade
+            x = sig[t - 1] * ret[j, t] - trade * fees[i]
+            if x != x:  # rendement manquant (ticker pas encore coté)
+                continue
+            wealth *= 1 + x
+            s1 += x
+            s2 += x * x
+            cnt += 1
+            if wealth > peak:
+                peak = wealth
+            if wealth / peak - 1 < mdd:
+                mdd = wealth / peak - 1
+        out[i, j, 0] = wealth - 1
+        out[i, j, 1] = s1 / cnt if cnt > 0 else np.nan
+        out[i, j, 2] = np.sqrt(max(s2 - s1 * s1 / cnt, 0.0) / (cnt - 1)) if cnt > 1 else np.nan
+        out[i, j, 3] = mdd
+        out[i, j, 4] = trades
+        out[i, j, 5] = exposure / n_bars
+
+
+def _param_sets(grid):
+    sets = pd.DataFrame([{**MODE_DEFAULTS, **g} for g in grid], columns=list(MODE_DEFAULTS))
+    sets['th_exit'] = sets['th_exit'].fillna(sets['th_buy'])
+    return sets
+
+
+def compute_rsi_mode(prices, fees, th_buy, th_panic, period, th_exit=None, trail_stop=0.0, min_hold=1, cooldown=0):
+    # Même sortie que compute_rsi_strategy (colonnes rsi, signal, ..., cum_strat) pour un ticker
+    df = prices[['price']].copy()
+    df['rsi'] = compute_rsi(df['price'], period)
+    sig = np.empty(len(df), np.int8)
+    _signal_path(df['rsi'].to_numpy(dtype=float), df['price'].to_numpy(dtype=float), float(th_buy),
+                 float(th_buy if th_exit is None else th_exit), float(th_panic), float(trail_stop),
+                 int(min_hold), int(cooldown), sig)
+    df['signal'] = sig.astype(int)
+    return strategy_returns(df, fees)
+
+
+def scan_rsi_modes(prices, grid, fees, periods_per_year=52):
+    """Backteste chaque jeu de paramètres de `grid` (liste de dicts, voir MODE_DEFAULTS) sur chaque colonne de `prices`.
+
+    Retourne une ligne par couple (jeu, ticker) : paramètres + métriques.
+    """
+    sets = _param_sets(grid)
+    periods = sorted(sets['period'].unique())
+    p_pos = {p: k for k, p in enumerate(periods)}
+    rsi = np.stack([compute_rsi(prices, p).to_numpy(dtype=float).T for p in periods])
+    price = np.ascontiguousarray(prices.to_numpy(dtype=float).T)
+    ret = np.ascontiguousarray(prices.pct_change().to_numpy(dtype=float).T)
+
+    out = np.empty((len(sets), prices.shape[1], 6))
+    _scan(rsi, price, ret, sets['period'].map(p_pos).to_numpy(np.int64),
+          sets['th_buy'].to_numpy(float), sets['th_exit'].to_numpy(float), sets['th_panic'].to_numpy(float),
+          sets['trail_stop'].to_numpy(float), sets['min_hold'].to_numpy(np.int64), sets['cooldown'].to_numpy(np.int64),
+          np.full(len(sets), float(fees)), out)
+
+    years = (prices.index[-1] - prices.index[0]).days / 365.25
+    total, mean, std, mdd, trades, exposure = np.moveaxis(out, 2, 0)
+    vol = std * np.sqrt(periods_per_year)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = {
+            "total_return": total,
+            "cagr": (1 + total) ** (1 / years) - 1 if years > 0 else np.zeros_like(total),
+            "volatility": vol,
+            "sharpe": np.where(vol > 0, mean * periods_per_year / vol, 0.0),
+            "max_drawdown": mdd,
+            "trades": trades,
+            "exposure": exposure,
+        }
+
+    result = sets.loc[sets.index.repeat(prices.shape[1])].reset_index(drop=True)
+    result.insert(0, 'ticker', np.tile(prices.columns.to_numpy(), len(sets)))
+    for name in METRICS:
+        result[name] = metrics[name].ravel()
+    return result
@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- PRÉCALCUL SPÉCULATIF DES VALEURS VOISINES ---
+# Après un calcul, on lance en tâche de fond les résultats pour les réglages
+# adjacents des sliders (±1 cran). Le prochain déplacement de slider est alors
+# servi directement depuis le cache.
+
+
+def neighbour_params(params, steps):
+    """Génère les jeux de paramètres voisins (un seul paramètre décalé de ±pas).
+
+    `steps` associe à chaque nom de paramètre un triplet (pas, minimum, maximum).
+    """
+    for name, (step, lo, hi) in steps.items():
+        for delta in (step, -step):
+            value = params[name] + delta
+            if lo <= value <= hi:
+                yield {**params, name: value}
+
+
+def params_key(params):
+    return tuple(sorted(params.items()))
+
+
+class SpeculativeCache:
+    """Cache LRU borné + pool de threads pour le précalcul des voisins.
+
+    - `max_entries` borne la mémoire (les résultats les plus anciens sont évincés).
+    - `max_workers` borne le CPU consommé en arrière-plan.
+    - Chaque appel à `prefetch` remplace la liste des voisins attendus : les
+      tâches encore en file qui n'en font plus partie sont annulées, et celles
+      déjà démarrées ne stockent pas leur résultat si elles sont obsolètes.
+    """
+
+    def __init__(self, max_entries=64, max_workers=None):
+        if max_workers is None:
+            max_workers = max(1, min(2, (os.cpu_count() or 1) - 1))
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._pending = {}
+        self._wanted = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative")
+
+    def _store(self, key, value):
+        self._results[key] = value
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def get(self, key, fn, *args, **kwargs):
+        # Résultat déjà calculé (éventuellement en arrière-plan)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+            future = self._pending.get(key)
+
+        # Calcul spéculatif en cours pour ce jeu de paramètres : on l'attend
+        if future is not None and not future.cancelled():
+            try:
+                value = future.result()
+            except Exception:
+                pass
+            else:
+                with self._lock:
+                    self._store(key, value)
+                return value
+
+        value = fn(*args, **kwargs)
+        with self._lock:
+            self._store(key, value)
+        return value
+
+    def _run(self, key, fn, args, kwargs):
+        try:
+            value = fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._pending.pop(key, None)
+            raise
+        with self._lock:
+            self._pending.pop(key, None)
+            if key in self._wanted:
+                self._store(key, value)
+        return value
+
+    def prefetch(self, jobs):
+        """`jobs` : liste de (clé, fonction, args, kwargs) à précalculer."""
+        with self._lock:
+            self._wanted = {key for key, *_ in jobs}
+
+            # Annulation du travail obsolète (paramètres qui ont sauté)
+            for key, future in list(self._pending.items()):
+                if key not in self._wanted and future.cancel():
+                    del self._pending[key]
+
+            for key, fn, args, kwargs in jobs:
+                if key in self._results or key in self._pending:
+                    continue
+                self._pending[key] = self._executor.submit(self._run, key, fn, args, kwargs)
@@ -0,0 +1,21 @@
+# --- UNIVERS D'INVESTISSEMENT DES PAGES MOMENTUM ---
+# Partagés entre les pages Streamlit et l'API locale (api.py).
+
+SECTORS = ['XLK', 'XLF', 'XLV', 'XLY', 'XLI', 'XLP', 'XLE', 'XLC', 'XLB', 'XLU', 'XLRE']
+
+TOP_30 = [
+    "NVDA", "GOOGL", "AAPL", "AMZN", "META", "AVGO", "TSLA", "BRK-B",
+    "LLY", "WMT", "JPM", "V", "XOM", "JNJ", "ORCL", "MA", "MU", "COST",
+    "AMD", "PLTR", "NFLX", "ABBV", "GE", "CSCO", "PG", "UNH", "KO", "CAT", "MS", "IBM"
+]
+
+# Univers large pour limiter le biais de survie (dédoublonné, ordre stable)
+EXTENDED_UNIVERSE = sorted(set([
+    "AAPL", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "INTC", "CSCO", "ORCL", "IBM",
+    "HPQ", "TXN", "AMD", "MU", "NFLX", "TSLA", "ADBE", "CRM", "PLTR", "AVGO", "APP",
+    "JPM", "BAC", "GS", "MS", "AXP", "V", "MA", "WFC", "C", "BRK-B",
+    "GE", "XOM", "CVX", "CAT", "BA", "MMM", "HON", "LMT", "DE", "F", "GM",
+    "WMT", "KO", "PEP", "PG", "JNJ", "PFE", "LLY", "UNH", "ABBV", "MRK", "AMGN",
+    "COST", "TGT", "HD", "MCD", "NKE", "DIS", "PM", "MO", "NEM",
+    "T", "VZ", "UPS", "FDX", "SBUX", "LOW", "ABT", "LRCX", "QCOM", "PGR"
+]))
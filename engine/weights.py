@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+# --- PONDÉRATION DU TOP-N (ÉGALE, INVERSE VOLATILITÉ, PARITÉ DE RISQUE, VARIANCE MINIMALE) ---
+# La covariance est tenue à jour de façon incrémentale : à chaque rebalancement
+# on ajoute les lignes entrées dans la fenêtre et on retire celles qui en sont
+# sorties, uniquement pour les tickers sélectionnés. Le coût dépend de la taille
+# de la sélection et du pas de la fenêtre, pas de l'historique ni de l'univers.
+
+WEIGHTINGS = {
+    "Égale": "equal",
+    "Inverse volatilité": "inverse_vol",
+    "Parité de risque": "risk_parity",
+    "Variance minimale": "min_variance",
+}
+
+# Variance par période en deçà de laquelle un prix est considéré comme figé
+MIN_VARIANCE = 1e-12
+
+
+class IncrementalCovariance:
+    """Covariance glissante des rendements (fenêtre de `window` lignes) d'un sous-ensemble de tickers.
+
+    Les rendements sont calculés à la demande depuis les prix, bloc par bloc :
+    rien n'est pré-calculé sur tout l'univers. Covariance par paires complètes
+    (comme DataFrame.cov) : chaque couple n'utilise que les lignes où les deux
+    tickers ont un rendement, un ticker récemment coté n'est donc pas compté
+    à 0 avant sa cotation.
+    """
+
+    def __init__(self, prices, window):
+        self.window = window
+        self._prices = prices.to_numpy(dtype=float)
+        self._col = {t: j for j, t in enumerate(prices.columns)}
+        self._tickers = []
+        self._lo = self._hi = 0
+        self._cnt = self._sum = self._cross = np.zeros((0, 0))
+
+    def _block(self, lo, hi, cols):
+        # Rendements des lignes [lo, hi) (la ligne 0 n'a pas de rendement) + masque des rendements valides
+        lo = max(lo, 1)
+        if hi <= lo:
+            return np.zeros((0, len(cols))), np.zeros((0, len(cols)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = self._prices[lo:hi, cols] / self._prices[lo - 1:hi - 1, cols] - 1
+        valid = np.isfinite(x)
+        x[~valid] = 0.0
+        return x, valid.astype(float)
+
+    @staticmethod
+    def _moments(xa, ma, xb, mb):
+        # Par couple (a, b) : nb de lignes communes, Σ x_a sur ces lignes, Σ x_a·x_b
+        return ma.T @ mb, xa.T @ mb, xa.T @ xb
+
+    def _reset(self, lo, hi, tickers):
+        x, m = self._block(lo, hi, [self._col[t] for t in tickers])
+        self._tickers = list(tickers)
+        self._cnt, self._sum, self._cross = self._moments(x, m, x, m)
+        self._lo, self._hi = lo, hi
+
+    def _set_tickers(self, tickers):
+        # Retrait des tickers sortis, ajout des nouveaux (moments croisés sur la fenêtre courante uniquement)
+        kept = [t for t in self._tickers if t in tickers]
+        added = [t for t in tickers if t not in self._tickers]
+        keep_idx = np.ix_(*[[self._tickers.index(t) for t in kept]] * 2)
+        stats = [a[keep_idx] for a in (self._cnt, self._sum, self._cross)]
+        if added:
+            xk, mk = self._block(self._lo, self._hi, [self._col[t] for t in kept])
+            xa, ma = self._block(self._lo, self._hi, [self._col[t] for t in added])
+            ka = self._moments(xk, mk, xa, ma)
+            ak = self._moments(xa, ma, xk, mk)
+            aa = self._moments(xa, ma, xa, ma)
+            stats = [np.block([[kk, k_a], [a_k, a_a]]) for kk, k_a, a_k, a_a in zip(stats, ka, ak, aa)]
+        self._tickers = kept + added
+        self._cnt, self._sum, self._cross = stats
+
+    def _slide(self, lo, hi):
+        cols = [self._col[t] for t in self._tickers]
+        for a, b, sign in ((self._hi, hi, 1.0), (self._lo, lo, -1.0)):
+            if b > a:
+                x, m = self._block(a, b, cols)
+                dn, ds, dc = self._moments(x, m, x, m)
+                self._cnt += sign * dn
+                self._sum += sign * ds
+                self._cross += sign * dc
+        self._lo, self._hi = lo, hi
+
+    def at(self, hi, tickers):
+        # Covariance des lignes [hi - window, hi) pour `tickers` (NaN si moins de 2 lignes communes)
+        lo = max(0, hi - self.window)
+        if not tickers:
+            return pd.DataFrame()
+        if hi < self._hi or lo >= self._hi or not self._tickers:
+            # Retour en arrière ou saut plus grand que la fenêtre : recalcul complet
+            self._reset(lo, hi, tickers)
+        else:
+            self._set_tickers(tickers)
+            self._slide(lo, hi)
+
+        order = np.ix_(*[[self._tickers.index(t) for t in tickers]] * 2)
+        n, s, c = self._cnt[order], self._sum[order], self._cross[order]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = np.where(n >= 2, (c - s * s.T / n) / (n - 1), np.nan)
+        return pd.DataFrame(cov, index=tickers, columns=tickers)
+
+
+def _nearest_psd(cov):
+    # Les covariances par paires peuvent ne pas être semi-définies positives : valeurs propres négatives ramenées à 0
+    vals, vecs = np.linalg.eigh(cov)
+    if vals.min() >= 0:
+        return cov
+    return (vecs * np.clip(vals, 0.0, None)) @ vecs.T
+
+
+def _shrink(cov, shrink):
+    # Rétrécissement vers la diagonale : matrice inversible même si la fenêtre est courte
+    return (1 - shrink) * cov + shrink * np.diag(np.diag(cov))
+
+
+def risk_parity_weights(cov, tol=1e-10, max_iter=500):
+    # Contributions au risque égales : descente par coordonnées sur min ½·w'Σw − Σ log(w_i) / k
+    # (problème convexe, converge pour toute Σ semi-définie positive, corrélations négatives comprises)
+    k = cov.shape[0]
+    diag = np.clip(np.diag(cov), MIN_VARIANCE, None)
+    w = 1 / np.sqrt(diag)
+    for _ in range(max_iter):
+        prev = w.copy()
+        for i in range(k):
+            # Racine positive de Σ_ii·w_i² + a·w_i − 1/k = 0, a = Σ_{j≠i} Σ_ij·w_j
+            a = cov[i] @ w - cov[i, i] * w[i]
+            w[i] = (-a + np.sqrt(a * a + 4 * diag[i] / k)) / (2 * diag[i])
+        if np.abs(w - prev).max() <= tol * np.abs(w).max():
+            break
+    return w / w.sum()
+
+
+def min_variance_weights(cov):
+    # Variance minimale sans vente à découvert : on retire les poids négatifs et on résout à nouveau
+    active = np.arange(cov.shape[0])
+    while len(active):
+        sub = cov[np.ix_(active, active)]
+        # Moindres carrés plutôt que solve : une sous-matrice singulière (ticker à variance nulle) ne lève pas
+        raw = np.linalg.lstsq(sub, np.ones(len(active)), rcond=None)[0]
+        if (raw >= 0).all():
+            w = np.zeros(cov.shape[0])
+            w[active] = raw / raw.sum()
+            return w
+        active = active[raw > 0] if (raw > 0).any() else active[[np.argmax(raw)]]
+    return np.full(cov.shape[0], 1 / cov.shape[0])
+
+
+def portfolio_weights(cov, method, shrink=0.1):
+    cov = np.asarray(cov, dtype=float)
+    k = cov.shape[0]
+    if method not in WEIGHTINGS.values():
+        raise ValueError(f"Pondération inconnue : {method}")
+    # Prix figé sur la fenêtre (ticker radié puis ffill) : volatilité nulle, pondération égale
+    # plutôt que tout le poids sur un ticker sans risque apparent
+    if method == "equal" or k <= 1 or (np.diag(cov) <= MIN_VARIANCE).any():
+        return np.full(k, 1 / k) if k else np.zeros(0)
+    if method == "inverse_vol":
+        w = 1 / np.sqrt(np.diag(cov))
+        return w / w.sum()
+    cov = _shrink(_nearest_psd(cov), shrink)
+    if method == "risk_parity":
+        return risk_parity_weights(cov)
+    return min_variance_weights(cov)
+
+
+class Weigher:
+    """Poids du top-N à une date donnée, à partir d'une IncrementalCovariance partagée le long du backtest."""
+
+    def __init__(self, prices, method, window):
+        self.method = method
+        self.index = prices.index
+        self.cov = IncrementalCovariance(prices, window) if method != "equal" else None
+
+    def __call__(self, dt, tickers):
+        if not tickers:
+            return {}
+        if self.cov is None:
+            return {t: 1 / len(tickers) for t in tickers}
+        hi = self.index.get_indexer([dt], method='ffill')[0] + 1
+        if hi < 2:
+            return {t: 1 / len(tickers) for t in tickers}
+        cov = self.cov.at(hi, list(tickers)).to_numpy()
+        if np.isnan(np.diag(cov)).any():
+            # Un ticker a moins de 2 rendements dans la fenêtre : volatilité inconnue, pondération égale
+            return {t: 1 / len(tickers) for t in tickers}
+        # Couples sans historique commun suffisant : corrélation supposée nulle
+        w = portfolio_weights(np.nan_to_num(cov, nan=0.0), self.method)
+        return dict(zip(tickers, w))
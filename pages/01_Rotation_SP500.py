@@ -1,9 +1,17 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import date
 
+from engine.benchmark import get_benchmark
+from engine.data import load_universe
+from engine.factors import VARIANTS
+from engine.momentum import backtest_sector_rotation, build_factors
+from engine.speculative import SpeculativeCache, neighbour_params, params_key
+from engine.universes import SECTORS
+from engine.weights import WEIGHTINGS
+from widgets import render_rolling_risk
+
 # 1. Configuration de la page
 st.set_page_config(page_title="Momentum Analytics Pro", layout="wide")
 
@@ -23,103 +31,83 @@ def calculate_metrics(returns):
 def run_momentum_pure():
     st.title("🚀 Momentum Pro : Analyse Complète & Historique Tickers")
     
-    sectors = ['XLK', 'XLF', 'XLV', 'XLY', 'XLI', 'XLP', 'XLE', 'XLC', 'XLB', 'XLU', 'XLRE']
+    sectors = SECTORS
     
     with st.sidebar:
-        st.header("⚙️ Paramètres Stratégie")
-        n_top = st.slider("Nombre de secteurs à détenir", 1, 5, 2)
-        lookback = st.slider("Look-back Momentum (mois)", 1, 12, 6)
-        holding_period = st.slider("Fréquence rotation secteurs (mois)", 1, 12, 9)
-        fees_pct = st.slider("Frais par transaction (%)", 0.0, 0.5, 0.1, step=0.01) / 100
+        # Formulaire : les réglages ne relancent le backtest qu'une fois validés
+        with st.form("parametres"):
+            st.header("⚙️ Paramètres Stratégie")
+            n_top = st.slider("Nombre de secteurs à détenir", 1, 5, 2)
+            lookback = st.slider("Look-back Momentum (mois)", 1, 12, 6)
+            variant = VARIANTS[st.selectbox("Définition du momentum", list(VARIANTS))]
+            holding_period = st.slider("Fréquence rotation secteurs (mois)", 1, 12, 9)
+            fees_pct = st.slider("Frais par transaction (%)", 0.0, 0.5, 0.1, step=0.01) / 100
+            weighting = WEIGHTINGS[st.selectbox("Pondération du portefeuille", list(WEIGHTINGS))]
         
-        st.divider()
-        st.header("🛡️ Market Timing")
-        use_market_timing = st.checkbox("Activer le filtre de tendance", value=True)
-        sma_period = st.slider("Moyenne Mobile S&P 500 (jours)", 50, 250, 150, disabled=not use_market_timing)
+            st.divider()
+            st.header("🛡️ Market Timing")
+            use_market_timing = st.checkbox("Activer le filtre de tendance", value=True)
+            sma_period = st.slider("Moyenne Mobile S&P 500 (jours)", 50, 250, 150,
+                                   help="Ignorée si le filtre de tendance est désactivé.")
         
+            st.divider()
+            st.header("📅 Période")
+            min_date, max_date = date(1999, 1, 1), date(2026, 12, 31)
+            start_date = st.date_input("Début", value=min_date, min_value=min_date, max_value=max_date)
+            end_date = st.date_input("Fin", value=max_date, min_value=min_date, max_value=max_date)
+
+            st.form_submit_button("✅ Appliquer", use_container_width=True)
+
         st.divider()
-        st.header("📅 Période")
-        min_date, max_date = date(1999, 1, 1), date(2026, 12, 31)
-        start_date = st.date_input("Début", value=min_date, min_value=min_date, max_value=max_date)
-        end_date = st.date_input("Fin", value=max_date, min_value=min_date, max_value=max_date)
+        speculative = st.checkbox("⚡ Précalcul des valeurs voisines", value=False,
+                                  help="Calcule en arrière-plan les résultats pour les réglages adjacents des sliders.")
 
     @st.cache_data
-    def load_data(s_date, e_date, lb_period, sma_p):
-        margin_start = pd.to_datetime(s_date) - pd.DateOffset(days=max(lb_period * 31, sma_p) + 60)
-        data = yf.download(sectors + ['SPY'], start=margin_start, end=e_date, progress=False)
-        if data.empty: return pd.DataFrame(), pd.DataFrame(), pd.Series()
-        closes = data['Adj Close'].ffill() if 'Adj Close' in data.columns else data['Close'].ffill()
-        opens = data['Open'].ffill()
-        spy_sma = closes['SPY'].rolling(window=sma_p).mean()
-        return closes, opens, spy_sma
+    def load_data(s_date, e_date):
+        # Marge fixe couvrant les réglages maximum (look-back 12 mois, SMA 250 j) :
+        # les données ne dépendent plus des sliders et sont réutilisables par le précalcul
+        return load_universe(SECTORS, s_date, e_date, margin_days=max(12 * 31, 250) + 60, bench='SPY')
+
+    @st.cache_resource(max_entries=4)
+    def load_factors(s_date, e_date):
+        # Cube momentum (mois × tickers × look-backs) + classements, partagé entre sessions
+        close_data, _ = load_data(s_date, e_date)
+        return build_factors(close_data, sectors)
+
+    @st.cache_resource
+    def get_speculative_cache():
+        return SpeculativeCache(max_entries=48)
 
     try:
         with st.spinner('Calcul des performances historiques...'):
-            close_data, open_data, spy_sma = load_data(start_date, end_date, lookback, sma_period)
+            close_data, open_data = load_data(start_date, end_date)
             if close_data.empty: return
 
-            monthly_close = close_data.resample('ME').last()
-            momentum = monthly_close[sectors].pct_change(lookback)
-            
-            history = []
-            pos_history = [] 
-            portfolio_changes = 0
-            current_top = []
-            is_invested = False 
-            
-            start_dt = pd.to_datetime(start_date)
-            valid_start_idx = lookback
-            for j in range(len(monthly_close)):
-                if monthly_close.index[j] >= start_dt and j >= lookback:
-                    valid_start_idx = j
-                    break
-
-            for i in range(valid_start_idx, len(monthly_close) - 1):
-                monthly_fees = 0
-                dt_now = monthly_close.index[i]
-                
-                idx_ref = spy_sma.index.get_indexer([dt_now], method='ffill')[0]
-                price_spy = close_data['SPY'].iloc[idx_ref]
-                val_sma = spy_sma.iloc[idx_ref]
-                market_is_bull = (price_spy > val_sma) if use_market_timing else True
-
-                if (i - valid_start_idx) % holding_period == 0:
-                    scores = momentum.iloc[i].dropna().sort_values(ascending=False)
-                    new_top = scores.index[:n_top].tolist()
-                    if is_invested and current_top:
-                        num_changes = len([s for s in new_top if s not in current_top])
-                        portfolio_changes += num_changes
-                        monthly_fees += (num_changes / n_top) * fees_pct
-                    current_top = new_top
-                    
-                    pos_history.append({
-                        'Période': dt_now.strftime('%b %Y'),
-                        'État': "INVESTI" if market_is_bull else "CASH (Sécurité)",
-                        'Tickers': ", ".join(current_top) if market_is_bull else "---"
-                    })
-
-                if market_is_bull and not is_invested:
-                    is_invested = True
-                    portfolio_changes += len(current_top)
-                    monthly_fees += fees_pct
-                elif not market_is_bull and is_invested:
-                    is_invested = False
-                    portfolio_changes += len(current_top)
-                    monthly_fees += fees_pct
-
-                d_start, d_end = monthly_close.index[i] + pd.Timedelta(days=1), monthly_close.index[i+1]
-                try:
-                    idx_s = open_data.index.get_indexer([d_start], method='bfill')[0]
-                    idx_e = close_data.index.get_indexer([d_end], method='ffill')[0]
-                    gross_ret = sum((close_data[t].iloc[idx_e] / open_data[t].iloc[idx_s]) - 1 for t in current_top) / n_top if is_invested else 0.0
-                    history.append({
-                        'Date': monthly_close.index[i+1], 
-                        'Ma Stratégie': gross_ret - monthly_fees, 
-                        'S&P 500': (close_data['SPY'].iloc[idx_e] / open_data['SPY'].iloc[idx_s]) - 1
-                    })
-                except: continue
-
-        df = pd.DataFrame(history).set_index('Date')
+            factors = load_factors(start_date, end_date)
+            benchmark = get_benchmark('SPY')
+            params = dict(start=start_date, end=end_date, n_top=n_top, lookback=lookback, holding=holding_period,
+                          fees=fees_pct, timing=use_market_timing, sma=sma_period, variant=variant,
+                          weighting=weighting)
+
+            def job(p):
+                return (params_key(p), backtest_sector_rotation,
+                        (close_data, open_data, sectors, p['start'], p['n_top'], p['lookback'], p['holding'],
+                         p['fees'], p['timing'], p['sma']),
+                        {'factors': factors, 'variant': p['variant'], 'trend': benchmark.trend(p['sma']),
+                         'weighting': p['weighting']})
+
+            cache = get_speculative_cache()
+            key, fn, args, kwargs = job(params)
+            result = cache.get(key, fn, *args, **kwargs)
+
+            if speculative:
+                cache.prefetch([job(p) for p in neighbour_params(params, {
+                    'lookback': (1, 1, 12), 'n_top': (1, 1, 5), 'sma': (1, 50, 250)})])
+
+            df = result['returns']
+            pos_history, portfolio_changes = result['positions'], result['trades']
+            is_invested, current_top = result['invested'], result['holdings']
+
         m_s = calculate_metrics(df['Ma Stratégie'])
         m_b = calculate_metrics(df['S&P 500'])
 
@@ -159,6 +147,9 @@ def run_momentum_pure():
             dd_spy = ((1 + df['S&P 500']).cumprod() / (1 + df['S&P 500']).cumprod().cummax() - 1) * 100
             st.line_chart(pd.DataFrame({'Ma Stratégie': dd_strat, 'S&P 500': dd_spy, 'Seuil -20%': -20}), color=["#0077b6", "#f39c12", "#e74c3c"])
 
+        st.divider()
+        render_rolling_risk(df[['Ma Stratégie', 'S&P 500']], df['S&P 500'], periods_per_year=12)
+
         # --- TABLES ---
         st.divider()
         col_tab1, col_tab2 = st.columns([1, 2])
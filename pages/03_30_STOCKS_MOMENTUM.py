@@ -1,10 +1,18 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from datetime import date
 
+from engine.benchmark import get_benchmark
+from engine.data import load_universe
+from engine.factors import VARIANTS
+from engine.momentum import backtest_top_stocks, build_factors
+from engine.speculative import SpeculativeCache, neighbour_params, params_key
+from engine.universes import TOP_30
+from engine.weights import WEIGHTINGS
+from widgets import render_rolling_risk
+
 # 1. Configuration de la page
 st.set_page_config(page_title="Momentum Analytics Pro - Historical Top 30", layout="wide")
 
@@ -35,136 +43,99 @@ def calculate_metrics(returns, portfolio_changes=None):
 def run_momentum_pure():
     st.title("🚀 Momentum Pro : Stratégie Top 30 (Historique & Frais Réels)")
     
-    tickers_list = [
-        "NVDA", "GOOGL", "AAPL", "AMZN", "META", "AVGO", "TSLA", "BRK-B", 
-        "LLY", "WMT", "JPM", "V", "XOM", "JNJ", "ORCL", "MA", "MU", "COST", 
-        "AMD", "PLTR", "NFLX", "ABBV", "GE", "CSCO", "PG", "UNH", "KO", "CAT", "MS", "IBM"
-    ]
+    tickers_list = TOP_30
     
     with st.sidebar:
-        st.header("⚙️ Paramètres Stratégie")
-        n_top = st.slider("Nombre d'actions à détenir", 1, 10, 5)
-        lookback = st.slider("Look-back Momentum (mois)", 1, 12, 6)
-        holding_period = st.slider("Fréquence rotation (mois)", 1, 12, 1)
-        fees_pct = st.slider("Frais par transaction (%)", 0.0, 0.5, 0.1, step=0.01) / 100
+        # Formulaire : les réglages ne relancent le backtest qu'une fois validés
+        with st.form("parametres"):
+            st.header("⚙️ Paramètres Stratégie")
+            n_top = st.slider("Nombre d'actions à détenir", 1, 10, 5)
+            lookback = st.slider("Look-back Momentum (mois)", 1, 12, 6)
+            variant = VARIANTS[st.selectbox("Définition du momentum", list(VARIANTS))]
+            holding_period = st.slider("Fréquence rotation (mois)", 1, 12, 1)
+            fees_pct = st.slider("Frais par transaction (%)", 0.0, 0.5, 0.1, step=0.01) / 100
+            weighting = WEIGHTINGS[st.selectbox("Pondération du portefeuille", list(WEIGHTINGS))]
         
-        st.divider()
-        st.header("🛡️ Market Timing")
-        use_market_timing = st.checkbox("Activer le filtre de tendance", value=True)
-        sma_period = st.slider("Moyenne Mobile S&P 500 (jours)", 50, 250, 200, disabled=not use_market_timing)
+            st.divider()
+            st.header("🛡️ Market Timing")
+            use_market_timing = st.checkbox("Activer le filtre de tendance", value=True)
+            sma_period = st.slider("Moyenne Mobile S&P 500 (jours)", 50, 250, 200,
+                                   help="Ignorée si le filtre de tendance est désactivé.")
         
-        st.divider()
-        st.header("📅 Période Historique")
-        # Modification ici : Plage de 1960 à aujourd'hui
-        min_hist = date(1960, 1, 1)
-        today = date.today()
+            st.divider()
+            st.header("📅 Période Historique")
+            # Modification ici : Plage de 1960 à aujourd'hui
+            min_hist = date(1960, 1, 1)
+            today = date.today()
         
-        start_date = st.date_input(
-            "Début", 
-            value=date(1990, 1, 1), 
-            min_value=min_hist, 
-            max_value=today
-        )
-        end_date = st.date_input(
-            "Fin", 
-            value=today, 
-            min_value=min_hist, 
-            max_value=today
-        )
+            start_date = st.date_input(
+                "Début", 
+                value=date(1990, 1, 1), 
+                min_value=min_hist, 
+                max_value=today
+            )
+            end_date = st.date_input(
+                "Fin", 
+                value=today, 
+                min_value=min_hist, 
+                max_value=today
+            )
+
+            st.form_submit_button("✅ Appliquer", use_container_width=True)
+
+        st.divider()
+        speculative = st.checkbox("⚡ Précalcul des valeurs voisines", value=False,
+                                  help="Calcule en arrière-plan les résultats pour les réglages adjacents des sliders.")
 
     @st.cache_data
-    def load_data(s_date, e_date, lb_period, sma_p):
-        margin_start = pd.to_datetime(s_date) - pd.DateOffset(days=max(lb_period * 31, sma_p) + 100)
-        data = yf.download(tickers_list + ['^GSPC'], start=margin_start, end=e_date, progress=False)
-        
-        if data.empty: return pd.DataFrame(), pd.DataFrame(), pd.Series()
-        
-        if isinstance(data.columns, pd.MultiIndex):
-            closes = data['Adj Close'].ffill() if 'Adj Close' in data.columns.levels[0] else data['Close'].ffill()
-            opens = data['Open'].ffill()
-        else:
-            closes = data[['Adj Close']].ffill() if 'Adj Close' in data.columns else data[['Close']].ffill()
-            opens = data[['Open']].ffill()
+    def load_data(s_date, e_date):
+        # Marge fixe couvrant les réglages maximum (look-back 12 mois, SMA 250 j) :
+        # les données ne dépendent plus des sliders et sont réutilisables par le précalcul
+        return load_universe(TOP_30, s_date, e_date, margin_days=max(12 * 31, 250) + 100, bench='^GSPC')
 
-        spy_sma = closes['^GSPC'].rolling(window=sma_p).mean() if '^GSPC' in closes.columns else pd.Series()
-        return closes, opens, spy_sma
+    @st.cache_resource(max_entries=4)
+    def load_factors(s_date, e_date):
+        # Cube momentum (mois × tickers × look-backs) + classements, partagé entre sessions
+        close_data, _ = load_data(s_date, e_date)
+        return build_factors(close_data, tickers_list)
+
+    @st.cache_resource
+    def get_speculative_cache():
+        return SpeculativeCache(max_entries=48)
 
     try:
         with st.spinner('Analyse des données et calcul des frais...'):
-            close_data, open_data, spy_sma = load_data(start_date, end_date, lookback, sma_period)
+            close_data, open_data = load_data(start_date, end_date)
             if close_data.empty: return
 
-            monthly_close = close_data.resample('ME').last()
-            momentum = monthly_close[tickers_list].pct_change(lookback)
-            
-            history = []
-            pos_history = [] 
-            is_invested = False 
-            current_top = []
-            portfolio_changes = 0
-            
-            start_dt = pd.to_datetime(start_date)
-            valid_idx = [i for i, idx in enumerate(monthly_close.index) if idx >= start_dt and i >= lookback]
-            
-            if not valid_idx:
+            factors = load_factors(start_date, end_date)
+            benchmark = get_benchmark('^GSPC')
+            params = dict(start=start_date, end=end_date, n_top=n_top, lookback=lookback, holding=holding_period,
+                          fees=fees_pct, timing=use_market_timing, sma=sma_period, variant=variant,
+                          weighting=weighting)
+
+            def job(p):
+                return (params_key(p), backtest_top_stocks,
+                        (close_data, open_data, tickers_list, p['start'], p['n_top'], p['lookback'], p['holding'],
+                         p['fees'], p['timing'], p['sma']),
+                        {'factors': factors, 'variant': p['variant'], 'trend': benchmark.trend(p['sma']),
+                         'weighting': p['weighting']})
+
+            cache = get_speculative_cache()
+            key, fn, args, kwargs = job(params)
+            result = cache.get(key, fn, *args, **kwargs)
+
+            if result is None:
                 st.error("Données insuffisantes.")
                 return
 
-            for i in range(valid_idx[0], len(monthly_close) - 1):
-                dt_now = monthly_close.index[i]
-                monthly_fees = 0.0 
-                
-                idx_ref = spy_sma.index.get_indexer([dt_now], method='ffill')[0]
-                market_is_bull = (close_data['^GSPC'].iloc[idx_ref] > spy_sma.iloc[idx_ref]) if use_market_timing else True
-
-                # --- Logique de Rotation ---
-                if (i - valid_idx[0]) % holding_period == 0:
-                    available_scores = momentum.iloc[i].dropna().sort_values(ascending=False)
-                    new_top = available_scores.index[:n_top].tolist()
-                    
-                    if is_invested and current_top:
-                        to_sell = [s for s in current_top if s not in new_top]
-                        to_buy = [s for s in new_top if s not in current_top]
-                        
-                        num_transac_rotation = len(to_sell) + len(to_buy)
-                        portfolio_changes += num_transac_rotation
-                        monthly_fees += (num_transac_rotation / n_top) * fees_pct
-                    
-                    current_top = new_top
-                    pos_history.append({
-                        'Période': dt_now.strftime('%Y-%m'), 
-                        'État': "INVESTI" if market_is_bull and current_top else "CASH", 
-                        'Tickers': ", ".join(current_top) if market_is_bull and current_top else "---"
-                    })
-
-                # --- Logique de Market Timing ---
-                was_invested = is_invested
-                is_invested = market_is_bull and len(current_top) > 0
-
-                if is_invested and not was_invested:
-                    portfolio_changes += len(current_top)
-                    monthly_fees += fees_pct 
-                elif not is_invested and was_invested:
-                    portfolio_changes += len(current_top)
-                    monthly_fees += fees_pct 
-
-                # --- Calcul des rendements ---
-                d_start, d_end = monthly_close.index[i] + pd.Timedelta(days=1), monthly_close.index[i+1]
-                try:
-                    idx_s = open_data.index.get_indexer([d_start], method='bfill')[0]
-                    idx_e = close_data.index.get_indexer([d_end], method='ffill')[0]
-                    
-                    if is_invested:
-                        raw_ret = sum((close_data[t].iloc[idx_e] / open_data[t].iloc[idx_s]) - 1 for t in current_top) / len(current_top)
-                        ret_strat = raw_ret - monthly_fees
-                    else:
-                        ret_strat = 0.0 - monthly_fees
-                        
-                    ret_bench = (close_data['^GSPC'].iloc[idx_e] / open_data['^GSPC'].iloc[idx_s]) - 1
-                    history.append({'Date': monthly_close.index[i+1], 'Ma Stratégie': ret_strat, 'S&P 500': ret_bench})
-                except: continue
-
-        df = pd.DataFrame(history).set_index('Date')
+            if speculative:
+                cache.prefetch([job(p) for p in neighbour_params(params, {
+                    'lookback': (1, 1, 12), 'n_top': (1, 1, 10), 'sma': (1, 50, 250)})])
+
+            df = result['returns']
+            pos_history, portfolio_changes = result['positions'], result['trades']
+
         m_s = calculate_metrics(df['Ma Stratégie'], portfolio_changes)
         m_b = calculate_metrics(df['S&P 500'])
 
@@ -179,6 +150,8 @@ def run_momentum_pure():
         fig.update_layout(yaxis_type="log", template="plotly_white", height=600, hovermode="x unified")
         st.plotly_chart(fig, use_container_width=True)
 
+        render_rolling_risk(df[['Ma Stratégie', 'S&P 500']], df['S&P 500'], periods_per_year=12)
+
         st.subheader("🔍 Historique des Tickers")
         st.dataframe(pd.DataFrame(pos_history).sort_index(ascending=False), use_container_width=True)
 
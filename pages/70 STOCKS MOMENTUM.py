@@ -1,10 +1,18 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from datetime import date, datetime
 
+from engine.benchmark import get_benchmark
+from engine.data import load_universe
+from engine.factors import VARIANTS
+from engine.momentum import backtest_extended_universe, build_factors
+from engine.speculative import SpeculativeCache, neighbour_params, params_key
+from engine.universes import EXTENDED_UNIVERSE
+from engine.weights import WEIGHTINGS
+from widgets import render_rolling_risk
+
 # 1. Configuration de la page
 st.set_page_config(page_title="Momentum Pro - 1960 Edition", layout="wide")
 
@@ -36,53 +44,53 @@ def run_momentum_pure():
     st.title("🚀 Momentum Pro : Analyse Long-Terme (1960 - Présent)")
     
     # Univers large pour limiter le biais de survie
-    extended_universe = [
-        "AAPL", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "INTC", "CSCO", "ORCL", "IBM", 
-        "HPQ", "TXN", "AMD", "MU", "NFLX", "TSLA", "ADBE", "CRM", "PLTR", "AVGO", "APP",
-        "JPM", "BAC", "GS", "MS", "AXP", "V", "MA", "WFC", "C", "BRK-B",
-        "GE", "XOM", "CVX", "CAT", "BA", "MMM", "HON", "LMT", "DE", "F", "GM",
-        "WMT", "KO", "PEP", "PG", "JNJ", "PFE", "LLY", "UNH", "ABBV", "MRK", "AMGN", 
-        "COST", "TGT", "HD", "MCD", "NKE", "DIS", "PM", "MO", "NEM",
-        "T", "VZ", "UPS", "FDX", "SBUX", "LOW", "ABT", "LRCX", "QCOM", "PGR"
-    ]
-    extended_universe = list(set(extended_universe))
+    extended_universe = EXTENDED_UNIVERSE
 
     with st.sidebar:
-        st.header("⚙️ Paramètres Stratégie")
-        n_top = st.slider("Nombre d'actions à détenir", 1, 15, 5)
-        lookback = st.slider("Look-back Momentum (mois)", 1, 12, 6)
-        holding_period = st.slider("Fréquence rotation (mois)", 1, 12, 1)
-        fees_pct = st.slider("Frais par transaction (%)", 0.0, 0.5, 0.1, step=0.01) / 100
+        # Formulaire : les réglages ne relancent le backtest qu'une fois validés
+        with st.form("parametres"):
+            st.header("⚙️ Paramètres Stratégie")
+            n_top = st.slider("Nombre d'actions à détenir", 1, 15, 5)
+            lookback = st.slider("Look-back Momentum (mois)", 1, 12, 6)
+            variant = VARIANTS[st.selectbox("Définition du momentum", list(VARIANTS))]
+            holding_period = st.slider("Fréquence rotation (mois)", 1, 12, 1)
+            fees_pct = st.slider("Frais par transaction (%)", 0.0, 0.5, 0.1, step=0.01) / 100
+            weighting = WEIGHTINGS[st.selectbox("Pondération du portefeuille", list(WEIGHTINGS))]
         
-        st.divider()
-        st.header("🛡️ Market Timing")
-        use_market_timing = st.checkbox("Activer le filtre de tendance", value=True)
-        sma_period = st.slider("Moyenne Mobile S&P 500 (jours)", 50, 250, 200)
+            st.divider()
+            st.header("🛡️ Market Timing")
+            use_market_timing = st.checkbox("Activer le filtre de tendance", value=True)
+            sma_period = st.slider("Moyenne Mobile S&P 500 (jours)", 50, 250, 200)
         
-        st.divider()
-        st.header("📅 Période Historique")
-        min_date = date(1960, 1, 1)
-        max_date = date.today()
+            st.divider()
+            st.header("📅 Période Historique")
+            min_date = date(1960, 1, 1)
+            max_date = date.today()
         
-        start_date = st.date_input("Date de début", value=min_date, min_value=min_date, max_value=max_date)
-        end_date = st.date_input("Date de fin", value=max_date, min_value=min_date, max_value=max_date)
+            start_date = st.date_input("Date de début", value=min_date, min_value=min_date, max_value=max_date)
+            end_date = st.date_input("Date de fin", value=max_date, min_value=min_date, max_value=max_date)
+
+            st.form_submit_button("✅ Appliquer", use_container_width=True)
+
+        st.divider()
+        speculative = st.checkbox("⚡ Précalcul des valeurs voisines", value=False,
+                                  help="Calcule en arrière-plan les résultats pour les réglages adjacents des sliders.")
 
     @st.cache_data
-    def load_data(s_date, e_date, sma_p):
-        margin_start = pd.to_datetime(s_date) - pd.DateOffset(days=sma_p + 180)
-        data = yf.download(extended_universe + ['^GSPC', 'SHY'], start=margin_start, end=e_date, progress=False)
-        
-        if data.empty: return pd.DataFrame(), pd.DataFrame(), pd.Series()
-        
-        if 'Adj Close' in data.columns:
-            closes = data['Adj Close'].ffill()
-        else:
-            closes = data['Close'].ffill()
-            
-        opens = data['Open'].ffill()
-        spy_sma = closes['^GSPC'].rolling(window=sma_p).mean()
-        
-        return closes, opens, spy_sma
+    def load_data(s_date, e_date):
+        # Marge fixe couvrant la SMA maximum (250 j) : les données ne dépendent
+        # plus des sliders et sont réutilisables par le précalcul
+        return load_universe(EXTENDED_UNIVERSE + ['SHY'], s_date, e_date, margin_days=250 + 180, bench='^GSPC')
+
+    @st.cache_resource(max_entries=4)
+    def load_factors(s_date, e_date):
+        # Cube momentum (mois × tickers × look-backs) + classements, partagé entre sessions
+        close_data, _ = load_data(s_date, e_date)
+        return build_factors(close_data, extended_universe)
+
+    @st.cache_resource
+    def get_speculative_cache():
+        return SpeculativeCache(max_entries=48)
 
     try:
         if start_date >= end_date:
@@ -90,76 +98,37 @@ def run_momentum_pure():
             return
 
         with st.spinner('Analyse des cycles historiques...'):
-            close_data, open_data, spy_sma = load_data(start_date, end_date, sma_period)
+            close_data, open_data = load_data(start_date, end_date)
             
             if close_data.empty:
                 st.error("Aucune donnée récupérée.")
                 return
 
-            monthly_close = close_data.resample('ME').last()
-            momentum = monthly_close[extended_universe].pct_change(lookback)
-            
-            history = []
-            pos_history = [] 
-            current_top = []
-            portfolio_changes = 0
-            
-            start_dt = pd.to_datetime(start_date)
-            
-            for i in range(len(monthly_close) - 1):
-                dt_now = monthly_close.index[i]
-                if dt_now < start_dt: continue
-                
-                dt_next = monthly_close.index[i+1]
-                monthly_fees = 0.0 
-                
-                idx_ref = close_data.index.get_indexer([dt_now], method='pad')[0]
-                market_is_bull = (close_data['^GSPC'].iloc[idx_ref] > spy_sma.iloc[idx_ref]) if use_market_timing else True
-
-                # --- Rotation Logique et Journalisation ---
-                if (i % holding_period == 0):
-                    present_tickers = close_data.iloc[idx_ref][extended_universe].dropna().index.tolist()
-                    if present_tickers:
-                        valid_mom = momentum.loc[dt_now, present_tickers].dropna()
-                        new_ranking = valid_mom.sort_values(ascending=False).head(n_top).index.tolist()
-                        
-                        if current_top:
-                            to_sell = [s for s in current_top if s not in new_ranking]
-                            to_buy = [s for s in new_ranking if s not in current_top]
-                            current_top = [s for s in current_top if s in new_ranking] + to_buy[:n_top-len([s for s in current_top if s in new_ranking])]
-                            
-                            change_count = len(to_sell) + len(to_buy)
-                            portfolio_changes += change_count
-                            monthly_fees += (change_count / n_top) * fees_pct
-                        else:
-                            current_top = new_ranking
-                            portfolio_changes += len(current_top)
-                            monthly_fees += fees_pct
-
-                    # On ajoute la ligne au journal des positions
-                    pos_history.append({
-                        'Période': dt_now.strftime('%Y-%m'),
-                        'État Marché': "HAUSSIER" if market_is_bull else "PRUDENCE",
-                        'Allocation': "ACTIONS" if market_is_bull else "CASH/SHY",
-                        'Tickers Sélectionnés': ", ".join(current_top) if (market_is_bull and current_top) else "---"
-                    })
-
-                # Calcul performance
-                idx_s = open_data.index.get_indexer([dt_now], method='bfill')[0]
-                idx_e = close_data.index.get_indexer([dt_next], method='ffill')[0]
-                
-                if market_is_bull and current_top:
-                    month_rets = (close_data[current_top].iloc[idx_e] / open_data[current_top].iloc[idx_s]) - 1
-                    ret_strat = month_rets.mean() - monthly_fees
-                else:
-                    shy_val = (close_data['SHY'].iloc[idx_e] / open_data['SHY'].iloc[idx_s]) - 1
-                    ret_strat = (shy_val if not np.isnan(shy_val) else 0.0) - monthly_fees
-                
-                ret_bench = (close_data['^GSPC'].iloc[idx_e] / open_data['^GSPC'].iloc[idx_s]) - 1
-                history.append({'Date': dt_next, 'Stratégie': ret_strat, 'S&P 500': ret_bench})
+            factors = load_factors(start_date, end_date)
+            benchmark = get_benchmark('^GSPC')
+            params = dict(start=start_date, end=end_date, n_top=n_top, lookback=lookback, holding=holding_period,
+                          fees=fees_pct, timing=use_market_timing, sma=sma_period, variant=variant,
+                          weighting=weighting)
+
+            def job(p):
+                return (params_key(p), backtest_extended_universe,
+                        (close_data, open_data, extended_universe, p['start'], p['n_top'], p['lookback'], p['holding'],
+                         p['fees'], p['timing'], p['sma']),
+                        {'factors': factors, 'variant': p['variant'], 'trend': benchmark.trend(p['sma']),
+                         'weighting': p['weighting']})
+
+            cache = get_speculative_cache()
+            key, fn, args, kwargs = job(params)
+            result = cache.get(key, fn, *args, **kwargs)
+
+            if speculative:
+                cache.prefetch([job(p) for p in neighbour_params(params, {
+                    'lookback': (1, 1, 12), 'n_top': (1, 1, 15), 'sma': (1, 50, 250)})])
+
+            results_df = result['returns']
+            pos_history, portfolio_changes = result['positions'], result['trades']
 
         # --- Graphique et Métriques ---
-        results_df = pd.DataFrame(history).set_index('Date')
         
         st.subheader("📊 Performance Cumulative (Échelle Log)")
         cum_rets = (1 + results_df).cumprod() * 100
@@ -175,6 +144,8 @@ def run_momentum_pure():
             calculate_metrics(results_df['S&P 500'])
         ], index=["Ma Stratégie", "Benchmark S&P 500"]).T)
 
+        render_rolling_risk(results_df[['Stratégie', 'S&P 500']], results_df['S&P 500'], periods_per_year=12)
+
         # --- TABLEAU DES TICKERS PAR PÉRIODE ---
         st.divider()
         st.subheader("📋 Journal des Sélections par Période")
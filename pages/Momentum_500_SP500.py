@@ -2,45 +2,59 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-import os
-import yfinance as yf
 from datetime import datetime
 
+from engine.benchmark import get_benchmark
+from engine.chunked import ChunkedFactors, open_sp500_store, prepare_sp500_chunked
+from engine.columnar import HAS_POLARS, prepare_sp500_lazy, sp500_date_range
+from engine.data import load_sp500_csv
+from engine.factors import VARIANTS, MomentumFactors
+from engine.momentum import backtest_sp500, prepare_sp500
+from engine.speculative import SpeculativeCache, neighbour_params, params_key
+from engine.weights import WEIGHTINGS
+from widgets import render_rolling_risk
+
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Momentum Strategy S&P 500", layout="wide")
 
 # --- CHARGEMENT DES DONNÉES ---
 @st.cache_data
 def load_local_data():
-    path = 'sp500_data_final.csv'
-    if not os.path.exists(path):
-        return None
-    df = pd.read_csv(path)
-    df['Date'] = pd.to_datetime(df['Date'])
-    df.set_index('Date', inplace=True)
-    return df.sort_index()
+    return load_sp500_csv()
 
 @st.cache_data
-def download_sp500_benchmark(start, end):
-    # Télécharge le ^GSPC pour le benchmark et la MM
-    data = yf.download("^GSPC", start=start, end=end, interval="1d")
-    if isinstance(data.columns, pd.MultiIndex): # Gère le nouveau format yfinance
-        data = data['Close']
-    else:
-        data = data[['Close']]
-    data.columns = ['^GSPC']
-    return data
+def load_date_range():
+    return sp500_date_range()
 
-# --- INITIALISATION ---
-df_assets = load_local_data()
+@st.cache_resource
+def load_panel_store():
+    return open_sp500_store()
+
+# --- BARRE LATÉRALE ---
+st.sidebar.header("🕹️ Paramètres")
+engines = {"Pandas (en mémoire)": "pandas", "Par blocs (hors mémoire)": "chunked"}
+if HAS_POLARS:
+    engines = {"Polars lazy (colonnaire)": "polars", **engines}
+data_engine = engines[st.sidebar.selectbox("Moteur de données", list(engines),
+                                           help="Polars : lecture Parquet des seules colonnes / dates utiles. "
+                                                "Par blocs : panel quotidien lu depuis le disque sous un budget mémoire fixe.")]
 
-if df_assets is None:
+# --- INITIALISATION ---
+# Moteurs colonnaire / par blocs : seules les bornes de dates sont lues, pas le panel complet
+if data_engine == "polars":
+    date_range = load_date_range()
+elif data_engine == "chunked":
+    store = load_panel_store()
+    date_range = None if store is None else (store.dates[0], store.dates[-1])
+else:
+    df_assets = load_local_data()
+    date_range = None if df_assets is None else (df_assets.index.min(), df_assets.index.max())
+
+if date_range is None:
     st.error("❌ Fichier 'sp500_data_final.csv' introuvable.")
     st.stop()
 
-# --- BARRE LATÉRALE ---
-st.sidebar.header("🕹️ Paramètres")
-data_min, data_max = df_assets.index.min().to_pydatetime(), df_assets.index.max().to_pydatetime()
+data_min, data_max = date_range[0].to_pydatetime(), date_range[1].to_pydatetime()
 
 start_date = st.sidebar.date_input("Début", data_min, min_value=datetime(1970, 1, 1))
 end_date = st.sidebar.date_input("Fin", data_max, max_value=datetime(2026, 12, 31))
@@ -48,58 +62,59 @@ end_date = st.sidebar.date_input("Fin", data_max, max_value=datetime(2026, 12, 3
 st.sidebar.markdown("---")
 st.sidebar.subheader("🚀 Momentum")
 lookback = st.sidebar.slider("Look-back (mois)", 1, 12, 6)
+variant = VARIANTS[st.sidebar.selectbox("Définition du momentum", list(VARIANTS))]
 holding = st.sidebar.slider("Holding (mois)", 1, 12, 1)
 n_tickers = st.sidebar.slider("Nombre de tickers (N)", 1, 20, 10)
+weighting = WEIGHTINGS[st.sidebar.selectbox("Pondération du portefeuille", list(WEIGHTINGS))]
 
 st.sidebar.markdown("---")
 st.sidebar.subheader("🛡️ Filtre de Tendance")
 ma_window = st.sidebar.slider("Moyenne Mobile S&P 500 (mois)", 2, 24, 10)
 
+st.sidebar.markdown("---")
+speculative = st.sidebar.checkbox("⚡ Précalcul des valeurs voisines", value=False,
+                                  help="Calcule en arrière-plan les résultats pour les réglages adjacents des sliders.")
+
 # --- LOGIQUE FINANCIÈRE ---
-def run_backtest(assets, start, end, lb, hold, n, ma_win):
-    # 1. Récupération du benchmark externe
-    df_bench = download_sp500_benchmark(start, end)
-    
-    # 2. Alignement des données
-    combined = pd.concat([assets, df_bench], axis=1).ffill().dropna(subset=['^GSPC'])
-    combined = combined.loc[pd.Timestamp(start):pd.Timestamp(end)]
-    
-    benchmark_prices = combined['^GSPC']
-    asset_prices = combined.drop(columns=['^GSPC'])
+@st.cache_resource
+def get_speculative_cache():
+    return SpeculativeCache(max_entries=32)
+
+@st.cache_resource(max_entries=4)  # panel mensuel + cube par période : seules les plus récentes restent en mémoire
+def load_monthly_factors(start, end, data_engine):
+    # Alignement avec le ^GSPC (service benchmark partagé), resample mensuel et cube momentum : une fois par période
+    gspc, _ = get_benchmark("^GSPC").frame("^GSPC")
+    gspc = gspc.loc[pd.Timestamp(start):pd.Timestamp(end)]
+    if data_engine == "chunked":
+        # Classements par blocs de tickers, fusion exacte des top-N partiels (N max = borne du slider)
+        m_assets, m_bench = prepare_sp500_chunked(load_panel_store(), gspc, start, end)
+        return m_assets, m_bench, ChunkedFactors(m_assets, n_max=20)
+    if data_engine == "polars":
+        m_assets, m_bench = prepare_sp500_lazy(gspc, start, end)
+    else:
+        m_assets, m_bench = prepare_sp500(load_local_data(), gspc, start, end)
+    return m_assets, m_bench, MomentumFactors(m_assets)
 
-    # 3. Resample mensuel
-    m_assets = asset_prices.resample('ME').last()
-    m_bench = benchmark_prices.resample('ME').last()
-    
-    # 4. Calcul MM et Signaux
-    ma_bench = m_bench.rolling(window=ma_win).mean()
-    returns_assets = m_assets.pct_change()
-    returns_bench = m_bench.pct_change()
-    momentum_signal = m_assets.pct_change(lb)
-    
-    strat_returns, dates, trend_bits = [], [], []
-    start_idx = max(lb, ma_win)
-    
-    for i in range(start_idx, len(m_assets) - hold, hold):
-        current_date = m_assets.index[i]
-        
-        # Filtre de tendance sur le S&P 500 téléchargé
-        if m_bench.loc[current_date] > ma_bench.loc[current_date]:
-            top_n = momentum_signal.loc[current_date].nlargest(n).index
-            future_perf = returns_assets.iloc[i+1 : i+1+hold][top_n].mean(axis=1)
-            trend_bits.extend([1] * len(future_perf))
-        else:
-            future_perf = pd.Series(0, index=returns_assets.index[i+1 : i+1+hold])
-            trend_bits.extend([0] * len(future_perf))
-        
-        strat_returns.extend(future_perf.values)
-        dates.extend(future_perf.index)
-
-    if not strat_returns: return None
-    
-    s_strat = pd.Series(strat_returns, index=dates)
-    s_bench = returns_bench.loc[dates]
-    return (1 + s_strat).cumprod(), (1 + s_bench).cumprod(), s_strat, s_bench, trend_bits
+def run_backtest(start, end, lb, hold, n, ma_win, variant, weighting, data_engine):
+    m_assets, m_bench, factors = load_monthly_factors(start, end, data_engine)
+    monthly_bench = get_benchmark("^GSPC").monthly()
+
+    params = dict(start=start, end=end, lb=lb, hold=hold, n=n, ma_win=ma_win, variant=variant, weighting=weighting)
+
+    def job(p):
+        return (params_key(p), backtest_sp500,
+                (m_assets, m_bench, p['lb'], p['hold'], p['n'], p['ma_win']),
+                {'factors': factors, 'variant': p['variant'], 'trend': monthly_bench.trend(p['ma_win']),
+                 'weighting': p['weighting']})
+
+    cache = get_speculative_cache()
+    key, fn, args, kwargs = job(params)
+    result = cache.get(key, fn, *args, **kwargs)
+
+    if speculative:
+        cache.prefetch([job(p) for p in neighbour_params(params, {
+            'lb': (1, 1, 12), 'n': (1, 1, 20), 'ma_win': (1, 2, 24)})])
+    return result
 
 # --- CALCUL MÉTRIQUES ---
 def get_metrics(cum, ret):
@@ -114,7 +129,7 @@ def get_metrics(cum, ret):
 # --- INTERFACE ---
 if st.button("🚀 Lancer le Backtest (Data Locale + ^GSPC Live)"):
     with st.spinner("Téléchargement du S&P 500 et calcul..."):
-        results = run_backtest(df_raw, start_date, end_date, lookback, holding, n_tickers, ma_window)
+        results = run_backtest(start_date, end_date, lookback, holding, n_tickers, ma_window, variant, weighting, data_engine)
     
     if results:
         res_s, res_b, ret_s, ret_b, trend_bits = results
@@ -142,5 +157,7 @@ if st.button("🚀 Lancer le Backtest (Data Locale + ^GSPC Live)"):
         fig_exp.add_trace(go.Scatter(x=res_s.index, y=trend_bits, fill='tozeroy', name="Exposition", line=dict(color='yellow', width=0)))
         fig_exp.update_layout(title="Exposition Marché (1 = Investi, 0 = Cash)", template="plotly_dark", height=150, yaxis=dict(tickvals=[0, 1]))
         st.plotly_chart(fig_exp, use_container_width=True)
+
+        render_rolling_risk(pd.DataFrame({'Stratégie': ret_s, 'S&P 500': ret_b}), ret_b, periods_per_year=12)
     else:
         st.warning("⚠️ Données insuffisantes. Essayez d'élargir la période de dates.")
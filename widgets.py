@@ -0,0 +1,21 @@
+import streamlit as st
+
+from engine.risk import ROLLING_WINDOWS, RollingRisk
+
+# --- COMPOSANTS D'AFFICHAGE PARTAGÉS (app.py ET PAGES) ---
+
+
+def rolling_risk_section(returns, bench, periods_per_year, risk_free_rate=0.0):
+    # Corps du bloc, à appeler tel quel depuis un fragment qui porte déjà d'autres widgets (app.py)
+    st.subheader("📉 Risque Glissant (1 / 3 / 5 ans)")
+    c1, c2 = st.columns(2)
+    window = c1.selectbox("Fenêtre", list(ROLLING_WINDOWS), index=1)
+    metric = c2.selectbox("Métrique", ["Sharpe", "Volatilité", "Drawdown", "Beta"])
+    if metric == "Sharpe":
+        st.caption(f"Taux sans risque : {risk_free_rate * 100:.2f} %")
+    risk = RollingRisk(returns, bench, periods_per_year=periods_per_year)
+    st.line_chart(risk.metrics(ROLLING_WINDOWS[window] * periods_per_year, risk_free_rate)[metric].dropna(how='all'))
+
+
+# Fragment : changer de fenêtre ou de métrique ne relance pas le backtest
+render_rolling_risk = st.fragment(rolling_risk_section)